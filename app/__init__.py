@@ -1,15 +1,140 @@
-from flask import Flask
+import importlib
+from flask import Flask, request
 from flask_sqlalchemy import SQLAlchemy
-from flask_cors import CORS
 from flask_migrate import Migrate
-from flasgger import Swagger
 
 db = SQLAlchemy()
 migrate = Migrate()
-swagger = Swagger()
 
-def create_app(config_class=None):
-    """Application factory pattern"""
+# (module under app.routes, url prefix) - modules are imported only when registered
+BLUEPRINTS = (
+    ('auth', '/api/auth'),
+    ('users', '/api/users'),
+    ('jobs', '/api/jobs'),
+    ('properties', '/api/properties'),
+    ('invoices', '/api/invoices'),
+    ('availability', '/api/availability'),
+    ('chat', '/api/chat'),
+    ('notifications', '/api/notifications'),
+    ('settings', '/api/settings'),
+)
+
+# Swagger UI configuration and base OpenAPI document (used when ENABLE_SWAGGER is on)
+_SWAGGER_CONFIG = {
+    'title': 'LDN API Documentation',
+    'uiversion': 3,
+    'openapi': '3.0.0',
+}
+
+_SWAGGER_TEMPLATE = {
+    'openapi': '3.0.0',
+    'info': {
+        'title': 'LDN API',
+        'description': 'API documentation for LDN application',
+        'version': '1.0.0',
+    },
+    'servers': [
+        {
+            'url': 'http://localhost:5000',
+            'description': 'Development server'
+        }
+    ],
+    'components': {
+        'securitySchemes': {
+            'Bearer': {
+                'type': 'http',
+                'scheme': 'bearer',
+                'bearerFormat': 'JWT',
+                'description': 'Enter JWT token'
+            }
+        }
+    },
+    'security': [
+        {
+            'Bearer': []
+        }
+    ]
+}
+
+CORS_ALLOWED_METHODS = 'GET, POST, PUT, DELETE, OPTIONS, PATCH'
+CORS_ALLOWED_HEADERS = 'Content-Type, Authorization'
+
+def init_cors(app):
+    """
+    Attach CORS headers to /api/* responses.
+    
+    Allowed origins are compiled into a frozenset once, so each request costs a
+    single hash lookup instead of re-matching a resources dict.
+    """
+    allowed_origins = frozenset(origin.strip() for origin in app.config.get('CORS_ALLOWED_ORIGINS', ['*']))
+    allow_all = '*' in allowed_origins
+    max_age = str(app.config.get('CORS_MAX_AGE', 600))
+    
+    @app.before_request
+    def cors_preflight():
+        # Answer preflight requests directly, without running auth or the view
+        if request.method == 'OPTIONS' and request.path.startswith('/api/'):
+            return app.response_class(status=204)
+    
+    @app.after_request
+    def add_cors_headers(response):
+        if not request.path.startswith('/api/'):
+            return response
+        
+        response.vary.add('Origin')
+        origin = request.headers.get('Origin')
+        if origin and (allow_all or origin in allowed_origins):
+            # Credentials are allowed, so the origin is echoed rather than '*'
+            headers = response.headers
+            headers['Access-Control-Allow-Origin'] = origin
+            headers['Access-Control-Allow-Credentials'] = 'true'
+            headers['Access-Control-Expose-Headers'] = 'Content-Type'
+            if request.method == 'OPTIONS':
+                headers['Access-Control-Allow-Methods'] = CORS_ALLOWED_METHODS
+                headers['Access-Control-Allow-Headers'] = CORS_ALLOWED_HEADERS
+                headers['Access-Control-Max-Age'] = max_age
+        return response
+
+def warm_statement_cache(app):
+    """
+    Run the hot User lookups once so their compiled SQL is already in the
+    engine's statement cache when the worker serves its first request.
+    
+    The statements must match the real call sites exactly (loader options
+    are part of the cache key). Failures are logged and ignored, e.g. when
+    the database is not reachable or the tables don't exist yet.
+    """
+    import uuid
+    from sqlalchemy.orm import raiseload
+    from app.models.user import User
+    
+    with app.app_context():
+        try:
+            # Current-user lookup (app.utils.auth.get_user_dict)
+            User.by_cognito_sub('__warmup__', raiseload('*'))
+            # Lookup by primary key (User.query.get_or_404)
+            db.session.get(User, uuid.UUID(int=0))
+            # Case-insensitive email lookup (auth.confirm_signup)
+            db.session.execute(
+                db.select(User.id).where(db.func.lower(User.email) == '__warmup__')
+            ).first()
+        except Exception as e:
+            app.logger.warning(f"Statement cache warm-up skipped: {e}")
+        finally:
+            db.session.rollback()
+            db.session.remove()
+
+def create_app(config_class=None, blueprints=None, *, enable_swagger=None, enable_cors=True):
+    """
+    Application factory pattern
+    
+    Args:
+        config_class: Configuration class (defaults to config.Config)
+        blueprints: Optional iterable of route module names to register
+            (e.g. ['auth', 'jobs']); registers all of BLUEPRINTS when None
+        enable_swagger: Serve /apidocs; defaults to the ENABLE_SWAGGER config value
+        enable_cors: Install the CORS request hooks (turn off for tests/internal apps)
+    """
     if config_class is None:
         from config import Config
         config_class = Config
@@ -17,79 +142,62 @@ def create_app(config_class=None):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # Connection pool - size to (gunicorn workers x threads); LIFO keeps the
+    # most recently used connections warm, pre_ping drops dead ones cheaply.
+    # psycopg prepares a statement server-side after prepare_threshold runs,
+    # and JIT is off since it only adds latency to short OLTP queries.
+    # Multi-row INSERTs (add_all flushes, bulk upserts) are sent as batched
+    # INSERT ... VALUES (...), (...) of up to insertmanyvalues_page_size rows.
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {
+        'pool_size': 20,
+        'max_overflow': 40,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+        'pool_use_lifo': True,
+        'insertmanyvalues_page_size': 1000,
+        'connect_args': {
+            'prepare_threshold': 5,
+            'options': '-c jit=off',
+        },
+    })
+    
+    # orjson for jsonify() and request.get_json()
+    from app.utils.json import ORJSONProvider
+    app.json = ORJSONProvider(app)
+    
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
     
-    # Initialize Swagger
-    swagger.init_app(app)
+    # Initialize Swagger (flasgger is only imported when docs are enabled)
+    # Config has to be in place before Swagger(app) reads it
+    if enable_swagger is None:
+        enable_swagger = app.config.get('ENABLE_SWAGGER')
+    if enable_swagger:
+        from flasgger import Swagger
+        app.config['SWAGGER'] = _SWAGGER_CONFIG
+        Swagger(app, template=_SWAGGER_TEMPLATE)
     
     # Configure CORS with allowed origins from config
     # If '*' is in the list, allow all origins (development)
     # Otherwise, use the specific origins (production)
-    cors_origins = app.config.get('CORS_ALLOWED_ORIGINS', ['*'])
-    if '*' in cors_origins:
-        CORS(app, resources={r"/api/*": {
-            "origins": "*",
-            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-            "allow_headers": ["Content-Type", "Authorization"],
-            "expose_headers": ["Content-Type"],
-            "supports_credentials": True
-        }})
-    else:
-        CORS(app, resources={r"/api/*": {
-            "origins": cors_origins,
-            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-            "allow_headers": ["Content-Type", "Authorization"],
-            "expose_headers": ["Content-Type"],
-            "supports_credentials": True
-        }})
+    if enable_cors:
+        init_cors(app)
+    
+    # Live GPS pings are flushed to the users table in batches
+    from app.utils.location_buffer import init_location_buffer
+    init_location_buffer(app)
     
     # Register blueprints - Clean resource-based structure
-    from app.routes import auth, users, jobs, properties, invoices, availability, chat, notifications, settings
-    
-    app.register_blueprint(auth.bp, url_prefix='/api/auth')
-    app.register_blueprint(users.bp, url_prefix='/api/users')
-    app.register_blueprint(jobs.bp, url_prefix='/api/jobs')
-    app.register_blueprint(properties.bp, url_prefix='/api/properties')
-    app.register_blueprint(invoices.bp, url_prefix='/api/invoices')
-    app.register_blueprint(availability.bp, url_prefix='/api/availability')
-    app.register_blueprint(chat.bp, url_prefix='/api/chat')
-    app.register_blueprint(notifications.bp, url_prefix='/api/notifications')
-    app.register_blueprint(settings.bp, url_prefix='/api/settings')
-    
-    # Swagger configuration
-    app.config['SWAGGER'] = {
-        'title': 'LDN API Documentation',
-        'uiversion': 3,
-        'openapi': '3.0.0',
-        'info': {
-            'title': 'LDN API',
-            'description': 'API documentation for LDN application',
-            'version': '1.0.0',
-        },
-        'servers': [
-            {
-                'url': 'http://localhost:5000',
-                'description': 'Development server'
-            }
-        ],
-        'components': {
-            'securitySchemes': {
-                'Bearer': {
-                    'type': 'http',
-                    'scheme': 'bearer',
-                    'bearerFormat': 'JWT',
-                    'description': 'Enter JWT token'
-                }
-            }
-        },
-        'security': [
-            {
-                'Bearer': []
-            }
-        ]
-    }
+    selected = set(blueprints) if blueprints is not None else None
+    for name, url_prefix in BLUEPRINTS:
+        if selected is None or name in selected:
+            module = importlib.import_module(f'app.routes.{name}')
+            app.register_blueprint(module.bp, url_prefix=url_prefix)
+    
+    # Pay SQL compilation for the hot queries at startup, not on a request
+    if app.config.get('WARM_STATEMENT_CACHE'):
+        warm_statement_cache(app)
     
     return app
 
@@ -1,38 +1,49 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.orm import Mapped, mapped_column
 from app import db
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
-from datetime import datetime, timezone
+from app.utils.uuid7 import uuid7
+from app.utils.serialize import dict_builder
+from app.utils.types import UUIDString
 
 class AssignmentLog(db.Model):
     """Assignment log model matching database_schema.sql SECTION 6"""
     __tablename__ = 'assignment_logs'
     
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    job_id = db.Column(UUID(as_uuid=True), db.ForeignKey('jobs.id', ondelete='CASCADE'), nullable=False)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    job_id: Mapped[str] = mapped_column(UUIDString, db.ForeignKey('jobs.id', ondelete='CASCADE'), nullable=False)
     
     # Previous and new clerk assignments
-    previous_clerk_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='SET NULL'))
-    new_clerk_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='SET NULL'))
+    previous_clerk_id: Mapped[Optional[str]] = mapped_column(UUIDString, db.ForeignKey('users.id', ondelete='SET NULL'))
+    new_clerk_id: Mapped[Optional[str]] = mapped_column(UUIDString, db.ForeignKey('users.id', ondelete='SET NULL'))
     
     # Action details
-    action_type = db.Column(db.String(50))  # 'AUTO_ASSIGN', 'MANUAL_OVERRIDE'
-    triggered_by_user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='SET NULL'))
-    reason = db.Column(db.Text)
+    action_type: Mapped[Optional[str]] = mapped_column(db.String(50))  # 'AUTO_ASSIGN', 'MANUAL_OVERRIDE'
+    triggered_by_user_id: Mapped[Optional[str]] = mapped_column(UUIDString, db.ForeignKey('users.id', ondelete='SET NULL'))
+    reason: Mapped[Optional[str]] = mapped_column(db.Text)
     
     # Timestamp
-    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    
-    def to_dict(self):
-        return {
-            'id': str(self.id),
-            'job_id': str(self.job_id),
-            'previous_clerk_id': str(self.previous_clerk_id) if self.previous_clerk_id else None,
-            'new_clerk_id': str(self.new_clerk_id) if self.new_clerk_id else None,
-            'action_type': self.action_type,
-            'triggered_by_user_id': str(self.triggered_by_user_id) if self.triggered_by_user_id else None,
-            'reason': self.reason,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    created_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime(timezone=True), server_default=db.func.now())
+    
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_assignment_logs_job_created', 'job_id', 'created_at'),
+        # All logs newest first (get_all_assignment_logs keyset pages)
+        db.Index('ix_assignment_logs_created_id', 'created_at', 'id'),
+    )
+    
+    @classmethod
+    def to_dict_bulk(cls, rows):
+        """Serialize a pre-loaded list of assignment logs"""
+        return [row.to_dict() for row in rows]
+    
+    _SIMPLE = ('job_id', 'previous_clerk_id', 'new_clerk_id', 'action_type',
+               'triggered_by_user_id', 'reason')
+    _UUIDS = ('id',)
+    _DTS = ('created_at',)
+    to_dict = dict_builder(_SIMPLE, _UUIDS, _DTS)
     
     def __repr__(self):
         return f'<AssignmentLog {self.id}>'
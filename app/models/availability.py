@@ -1,24 +1,30 @@
 from app import db
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
-from datetime import datetime, time, timezone
+from app.utils.uuid7 import uuid7
+from app.utils.serialize import u, iso
+from datetime import time
+
+# Default working hours for an availability day
+_T_START = time(8, 0)
+_T_END = time(18, 0)
 
 class ClerkAvailability(db.Model):
     """Clerk availability model matching database_schema.sql SECTION 2.5"""
     __tablename__ = 'clerk_availability'
     
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    # No separate index: _user_date_uc (user_id, available_date) leads with user_id
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     
     # The specific date the clerk is available/unavailable
     available_date = db.Column(db.Date, nullable=False, index=True)
     
     # TRUE = Clerk can work this day, FALSE = Blocked off
-    is_available = db.Column(db.Boolean, default=True, index=True)
+    is_available = db.Column(db.Boolean, default=True)
     
     # Optional: Specific hours (defaults to full day 08:00-18:00)
-    start_time = db.Column(db.Time, default=time(8, 0))
-    end_time = db.Column(db.Time, default=time(18, 0))
+    start_time = db.Column(db.Time, default=_T_START)
+    end_time = db.Column(db.Time, default=_T_END)
     
     # Postcode for this availability date (used for location-based job matching)
     # Pre-filled from user profile but can be edited per date
@@ -28,24 +34,30 @@ class ClerkAvailability(db.Model):
     notes = db.Column(db.Text)
     
     # Timestamps
-    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), server_onupdate=db.FetchedValue())
     
-    # Unique constraint
-    __table_args__ = (db.UniqueConstraint('user_id', 'available_date', name='_user_date_uc'),)
+    # Unique constraint (its index serves user_id and user_id + date/range
+    # filters; date-only filters use the available_date index); partial
+    # index covers the "open days" lookups
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'available_date', name='_user_date_uc'),
+        db.Index('ix_avail_user_date_open', 'user_id', 'available_date',
+                 postgresql_where=db.text('is_available = true')),
+    )
     
     def to_dict(self):
         return {
-            'id': str(self.id),
-            'user_id': str(self.user_id),
-            'available_date': self.available_date.isoformat() if self.available_date else None,
+            'id': u(self.id),
+            'user_id': u(self.user_id),
+            'available_date': iso(self.available_date),
             'is_available': self.is_available,
             'start_time': self.start_time.strftime('%H:%M:%S') if self.start_time else None,
             'end_time': self.end_time.strftime('%H:%M:%S') if self.end_time else None,
             'postcode': self.postcode,
             'notes': self.notes,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': iso(self.created_at),
+            'updated_at': iso(self.updated_at)
         }
     
     def __repr__(self):
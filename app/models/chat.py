@@ -1,28 +1,49 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.orm import Mapped, mapped_column
 from app import db
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
-from datetime import datetime, timezone
+from app.utils.uuid7 import uuid7
+from app.utils.serialize import dict_builder
+from app.utils.types import UUIDString
 
 class ChatMessage(db.Model):
     """Chat message model matching database_schema.sql SECTION 7"""
     __tablename__ = 'chat_messages'
     
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    job_id = db.Column(UUID(as_uuid=True), db.ForeignKey('jobs.id', ondelete='CASCADE'), nullable=False)
-    sender_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='SET NULL'))
-    content = db.Column(db.Text)
-    attachment_url = db.Column(db.Text)
-    sent_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    is_system_message = db.Column(db.Boolean, default=False)
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    job_id: Mapped[str] = mapped_column(UUIDString, db.ForeignKey('jobs.id', ondelete='CASCADE'), nullable=False)
+    sender_id: Mapped[Optional[str]] = mapped_column(UUIDString, db.ForeignKey('users.id', ondelete='SET NULL'))
+    content: Mapped[Optional[str]] = mapped_column(db.Text)
+    attachment_url: Mapped[Optional[str]] = mapped_column(db.Text)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime(timezone=True), server_default=db.func.now())
+    is_system_message: Mapped[Optional[bool]] = mapped_column(db.Boolean, default=False)
+    
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_chat_msg_job_sent', 'job_id', 'sent_at'),
+    )
+    
+    @classmethod
+    def to_dict_bulk(cls, rows):
+        """Serialize a pre-loaded list of messages"""
+        return [row.to_dict() for row in rows]
     
-    def to_dict(self):
+    _SIMPLE = ('job_id', 'sender_id', 'content', 'attachment_url', 'is_system_message')
+    _UUIDS = ('id',)
+    _DTS = ('sent_at',)
+    to_dict = dict_builder(_SIMPLE, _UUIDS, _DTS)
+    
+    def to_raw(self):
+        """Like to_dict(), but leaves UUID/datetime/Decimal values for app.utils.json to encode"""
         return {
-            'id': str(self.id),
-            'job_id': str(self.job_id),
-            'sender_id': str(self.sender_id) if self.sender_id else None,
+            'id': self.id,
+            'job_id': self.job_id,
+            'sender_id': self.sender_id,
             'content': self.content,
             'attachment_url': self.attachment_url,
-            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+            'sent_at': self.sent_at,
             'is_system_message': self.is_system_message
         }
     
@@ -33,16 +54,19 @@ class ChatParticipant(db.Model):
     """Chat participant model for tracking read status"""
     __tablename__ = 'chat_participants'
     
-    job_id = db.Column(UUID(as_uuid=True), db.ForeignKey('jobs.id', ondelete='CASCADE'), primary_key=True)
-    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
-    last_read_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    job_id: Mapped[str] = mapped_column(UUIDString, db.ForeignKey('jobs.id', ondelete='CASCADE'), primary_key=True)
+    user_id: Mapped[str] = mapped_column(UUIDString, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    last_read_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime(timezone=True), server_default=db.func.now())
     
-    def to_dict(self):
-        return {
-            'job_id': str(self.job_id),
-            'user_id': str(self.user_id),
-            'last_read_at': self.last_read_at.isoformat() if self.last_read_at else None
-        }
+    # Indexes - the PK leads with job_id; "all chats for a user" needs user_id first.
+    # INCLUDE makes read-state lookups index-only.
+    __table_args__ = (
+        db.Index('ix_chat_part_user_job', 'user_id', 'job_id', postgresql_include=['last_read_at']),
+    )
+    
+    _SIMPLE = ('job_id', 'user_id')
+    _DTS = ('last_read_at',)
+    to_dict = dict_builder(_SIMPLE, dts=_DTS)
     
     def __repr__(self):
         return f'<ChatParticipant job={self.job_id} user={self.user_id}>'
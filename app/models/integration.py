@@ -1,13 +1,13 @@
 from app import db
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
-from datetime import datetime, timezone
+from app.utils.uuid7 import uuid7
+from app.utils.serialize import dict_builder
 
 class IntegrationSettings(db.Model):
     """Integration settings model matching database_schema.sql SECTION 3"""
     __tablename__ = 'integration_settings'
     
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     service_name = db.Column(db.String(50), default='inventorybase', unique=True)
     
     # OAuth Credentials
@@ -21,20 +21,13 @@ class IntegrationSettings(db.Model):
     
     # Meta
     last_synced_at = db.Column(db.DateTime(timezone=True))
-    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), server_onupdate=db.FetchedValue())
     
-    def to_dict(self):
-        return {
-            'id': str(self.id),
-            'service_name': self.service_name,
-            'client_id': self.client_id,
-            'access_token': self.access_token,  # In production, consider masking this
-            'refresh_token': self.refresh_token,  # In production, consider masking this
-            'token_expires_at': self.token_expires_at.isoformat() if self.token_expires_at else None,
-            'scope': self.scope,
-            'last_synced_at': self.last_synced_at.isoformat() if self.last_synced_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    # access_token / refresh_token are returned as stored; consider masking in production
+    _SIMPLE = ('service_name', 'client_id', 'access_token', 'refresh_token', 'scope')
+    _UUIDS = ('id',)
+    _DTS = ('token_expires_at', 'last_synced_at', 'updated_at')
+    to_dict = dict_builder(_SIMPLE, _UUIDS, _DTS)
     
     def __repr__(self):
         return f'<IntegrationSettings {self.service_name}>'
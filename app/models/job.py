@@ -1,19 +1,19 @@
 from app import db
 from sqlalchemy.dialects.postgresql import UUID, JSONB
-import uuid
-from datetime import datetime, timezone
+from app.utils.uuid7 import uuid7
+from app.utils.serialize import raw_builder, dict_from_raw
 from app.utils.helpers import convert_handover_snake_to_camel
 
 class Job(db.Model):
     """Job model matching database_schema.sql SECTION 5"""
     __tablename__ = 'jobs'
     
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     
     # Relationships
     property_id = db.Column(UUID(as_uuid=True), db.ForeignKey('properties.id'), nullable=False)
     created_by_user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'))
-    assigned_clerk_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), index=True)
+    assigned_clerk_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'))
     assigned_agent_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'))
     
     # Logistics Data (SOW 3.2)
@@ -26,11 +26,11 @@ class Job(db.Model):
     access_instructions = db.Column(db.Text)
     key_location = db.Column(db.String(255))
     key_release_received = db.Column(db.Boolean, default=False)
-    admin_attachments = db.Column(JSONB, default=[])
+    admin_attachments = db.Column(JSONB, server_default=db.text("'[]'::jsonb"))
     admin_notes = db.Column(db.Text)
     
     # Booking Questions (Client Requirement)
-    booking_questions = db.Column(JSONB, default={})
+    booking_questions = db.Column(JSONB, server_default=db.text("'{}'::jsonb"))
     
     # Status Workflow (SOW 3.3)
     status = db.Column(db.Enum(
@@ -46,59 +46,66 @@ class Job(db.Model):
     # The Logistics Tracker (SOW 3.6)
     on_route_at = db.Column(db.DateTime(timezone=True))
     check_in_at = db.Column(db.DateTime(timezone=True))
-    check_in_lat = db.Column(db.Numeric(10, 8))
-    check_in_lng = db.Column(db.Numeric(11, 8))
+    check_in_lat = db.Column(db.Float(precision=53))
+    check_in_lng = db.Column(db.Float(precision=53))
     location_warning_flag = db.Column(db.Boolean, default=False)
     
     # Handover Data (Digital Proof)
-    handover_data = db.Column(JSONB, default={})
+    handover_data = db.Column(JSONB, server_default=db.text("'{}'::jsonb"))
     
     # Departure
     check_out_at = db.Column(db.DateTime(timezone=True))
-    check_out_lat = db.Column(db.Numeric(10, 8))
-    check_out_lng = db.Column(db.Numeric(11, 8))
+    check_out_lat = db.Column(db.Float(precision=53))
+    check_out_lng = db.Column(db.Float(precision=53))
     
     # Timestamps
-    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), server_onupdate=db.FetchedValue())
     
     # Relationships
-    chat_messages = db.relationship('ChatMessage', backref='job', lazy='dynamic', cascade='all, delete-orphan')
-    chat_participants = db.relationship('ChatParticipant', backref='job', lazy='dynamic', cascade='all, delete-orphan')
-    notifications = db.relationship('Notification', backref='job', lazy='dynamic')
-    assignment_logs = db.relationship('AssignmentLog', backref='job', lazy='dynamic', cascade='all, delete-orphan')
-    
-    def to_dict(self):
-        return {
-            'id': str(self.id),
-            'property_id': str(self.property_id),
-            'created_by_user_id': str(self.created_by_user_id) if self.created_by_user_id else None,
-            'assigned_clerk_id': str(self.assigned_clerk_id) if self.assigned_clerk_id else None,
-            'assigned_agent_id': str(self.assigned_agent_id) if self.assigned_agent_id else None,
-            'job_type': self.job_type,
-            'priority': self.priority,
-            'appointment_date': self.appointment_date.isoformat() if self.appointment_date else None,
-            'estimated_duration_minutes': self.estimated_duration_minutes,
-            'access_instructions': self.access_instructions,
-            'key_location': self.key_location,
-            'key_release_received': self.key_release_received,
-            'admin_attachments': self.admin_attachments,
-            'admin_notes': self.admin_notes,
-            'booking_questions': self.booking_questions,
-            'status': self.status,
-            'on_route_at': self.on_route_at.isoformat() if self.on_route_at else None,
-            'check_in_at': self.check_in_at.isoformat() if self.check_in_at else None,
-            'check_in_lat': float(self.check_in_lat) if self.check_in_lat else None,
-            'check_in_lng': float(self.check_in_lng) if self.check_in_lng else None,
-            'location_warning_flag': self.location_warning_flag,
-            # Convert handover_data from database snake_case to frontend camelCase
-            'handover_data': convert_handover_snake_to_camel(self.handover_data) if self.handover_data else {},
-            'check_out_at': self.check_out_at.isoformat() if self.check_out_at else None,
-            'check_out_lat': float(self.check_out_lat) if self.check_out_lat else None,
-            'check_out_lng': float(self.check_out_lng) if self.check_out_lng else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    # Child collections are write-only: nothing renders them through the job, and
+    # the FKs cascade in the database, so deleting a job never loads them.
+    chat_messages = db.relationship('ChatMessage', backref='job', lazy='write_only', cascade='all, delete-orphan', passive_deletes=True)
+    chat_participants = db.relationship('ChatParticipant', backref='job', lazy='write_only', cascade='all, delete-orphan', passive_deletes=True)
+    notifications = db.relationship('Notification', backref='job', lazy='write_only')
+    assignment_logs = db.relationship('AssignmentLog', backref='job', lazy='write_only', cascade='all, delete-orphan', passive_deletes=True)
+    
+    # Indexes
+    # Leading assigned_clerk_id also serves plain clerk lookups, so no separate index on it
+    __table_args__ = (
+        db.Index('ix_jobs_clerk_status_appt', 'assigned_clerk_id', 'status', 'appointment_date'),
+        db.Index('ix_jobs_open', 'assigned_clerk_id', 'appointment_date',
+                 postgresql_where=db.text("status IN ('pending_assignment','assigned','on_route','in_progress')")),
+        # Property filter; status + check_out_at also serve the latest-completed-job lookup
+        db.Index('ix_jobs_property_status_checkout', 'property_id', 'status', 'check_out_at'),
+        # Agent filter (get_jobs?agent_id=)
+        db.Index('ix_jobs_agent_status', 'assigned_agent_id', 'status'),
+    )
+    
+    @classmethod
+    def to_dict_bulk(cls, rows):
+        """Serialize a pre-loaded list of jobs"""
+        return [row.to_dict() for row in rows]
+    
+    # Response fields, in order; to_dict() formats _UUIDS and _DTS as strings
+    _FIELDS = ('id', 'property_id', 'created_by_user_id', 'assigned_clerk_id', 'assigned_agent_id',
+               'job_type', 'priority', 'appointment_date', 'estimated_duration_minutes',
+               'access_instructions', 'key_location', 'key_release_received', 'admin_attachments',
+               'admin_notes', 'booking_questions', 'status', 'on_route_at', 'check_in_at',
+               'check_in_lat', 'check_in_lng', 'location_warning_flag', 'handover_data',
+               'check_out_at', 'check_out_lat', 'check_out_lng', 'created_at', 'updated_at')
+    _UUIDS = ('id', 'property_id', 'created_by_user_id', 'assigned_clerk_id', 'assigned_agent_id')
+    _DTS = ('appointment_date', 'on_route_at', 'check_in_at', 'check_out_at', 'created_at', 'updated_at')
+    _raw_fields = raw_builder(_FIELDS)
+    
+    def to_raw(self):
+        """Like to_dict(), but leaves UUID/datetime/Decimal values for app.utils.json to encode"""
+        d = self._raw_fields()
+        # Convert handover_data from database snake_case to frontend camelCase
+        d['handover_data'] = convert_handover_snake_to_camel(self.handover_data) if self.handover_data else {}
+        return d
+    
+    to_dict = dict_from_raw(_UUIDS, _DTS)
     
     def __repr__(self):
         return f'<Job {self.id}>'
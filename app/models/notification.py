@@ -1,41 +1,52 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.orm import Mapped, mapped_column
 from app import db
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
-from datetime import datetime, timezone
+from app.utils.uuid7 import uuid7
+from app.utils.serialize import dict_builder
+from app.utils.types import UUIDString
 
 class Notification(db.Model):
     """Notification model matching database_schema.sql SECTION 8"""
     __tablename__ = 'notifications'
     
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
-    related_job_id = db.Column(UUID(as_uuid=True), db.ForeignKey('jobs.id'))
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    user_id: Mapped[str] = mapped_column(UUIDString, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    related_job_id: Mapped[Optional[str]] = mapped_column(UUIDString, db.ForeignKey('jobs.id'))
     
     # Content
-    type = db.Column(db.String(50))  # 'JOB_ASSIGNED', 'OVERDUE', etc.
-    title = db.Column(db.String(255))
-    body = db.Column(db.Text)
+    type: Mapped[Optional[str]] = mapped_column(db.String(50))  # 'JOB_ASSIGNED', 'OVERDUE', etc.
+    title: Mapped[Optional[str]] = mapped_column(db.String(255))
+    body: Mapped[Optional[str]] = mapped_column(db.Text)
     
     # Channel & Delivery Tracking (SOW 3.4 Compliance)
-    channel = db.Column(db.Enum('in_app', 'email', 'sms', name='notification_channel_enum'), default='in_app')
-    delivery_status = db.Column(db.String(50), default='sent')  # 'sent', 'failed', 'delivered'
-    
-    is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    
-    def to_dict(self):
-        return {
-            'id': str(self.id),
-            'user_id': str(self.user_id),
-            'related_job_id': str(self.related_job_id) if self.related_job_id else None,
-            'type': self.type,
-            'title': self.title,
-            'body': self.body,
-            'channel': self.channel,
-            'delivery_status': self.delivery_status,
-            'is_read': self.is_read,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    channel: Mapped[Optional[str]] = mapped_column(db.Enum('in_app', 'email', 'sms', name='notification_channel_enum'), default='in_app')
+    delivery_status: Mapped[Optional[str]] = mapped_column(db.String(50), default='sent')  # 'sent', 'failed', 'delivered'
+    
+    is_read: Mapped[Optional[bool]] = mapped_column(db.Boolean, default=False, server_default=db.false())
+    created_at: Mapped[Optional[datetime]] = mapped_column(db.DateTime(timezone=True), server_default=db.func.now())
+    
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_notif_user_read_created', 'user_id', 'is_read', 'created_at'),
+        # A user's notifications newest first (get_notifications keyset pages)
+        db.Index('ix_notif_user_created_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_notifications_unread', 'user_id', 'created_at',
+                 postgresql_where=db.text('is_read = false')),
+    )
+    
+    @classmethod
+    def to_dict_bulk(cls, rows):
+        """Serialize a pre-loaded list of notifications"""
+        return [row.to_dict() for row in rows]
+    
+    _SIMPLE = ('user_id', 'related_job_id', 'type', 'title', 'body',
+               'channel', 'delivery_status', 'is_read')
+    _UUIDS = ('id',)
+    _DTS = ('created_at',)
+    to_dict = dict_builder(_SIMPLE, _UUIDS, _DTS)
     
     def __repr__(self):
         return f'<Notification {self.id}>'
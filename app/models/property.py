@@ -1,13 +1,13 @@
 from app import db
 from sqlalchemy.dialects.postgresql import UUID, JSONB
-import uuid
-from datetime import datetime, timezone
+from app.utils.uuid7 import uuid7
+from app.utils.serialize import raw_builder, dict_from_raw
 
 class Property(db.Model):
     """Property model matching database_schema.sql SECTION 4"""
     __tablename__ = 'properties'
     
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     
     # External Identifiers (InventoryBase API)
     inventorybase_id = db.Column(db.Integer, unique=True, nullable=False)
@@ -22,8 +22,8 @@ class Property(db.Model):
     postcode = db.Column(db.String(20), nullable=False, index=True)
     
     # Geo-location (Critical for SOW 3.2)
-    latitude = db.Column(db.Numeric(10, 8), index=True)
-    longitude = db.Column(db.Numeric(11, 8), index=True)
+    latitude = db.Column(db.Float(precision=53), index=True)
+    longitude = db.Column(db.Float(precision=53), index=True)
     
     # Attributes
     property_type = db.Column(db.String(50))
@@ -33,8 +33,8 @@ class Property(db.Model):
     client_name = db.Column(db.String(255))
     
     # Flexible Data (JSONB)
-    tags = db.Column(JSONB, default=[])
-    custom_fields = db.Column(JSONB, default={})
+    tags = db.Column(JSONB, server_default=db.text("'[]'::jsonb"))
+    custom_fields = db.Column(JSONB, server_default=db.text("'{}'::jsonb"))
     notes = db.Column(db.Text)
     
     # Meter Location
@@ -46,40 +46,24 @@ class Property(db.Model):
     last_synced_at = db.Column(db.DateTime(timezone=True))
     
     # Timestamps
-    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), server_onupdate=db.FetchedValue())
     
     # Relationships
     jobs = db.relationship('Job', backref='property', lazy='dynamic')
     
-    def to_dict(self):
-        return {
-            'id': str(self.id),
-            'inventorybase_id': self.inventorybase_id,
-            'reference_number': self.reference_number,
-            'uprn': self.uprn,
-            'parent_property_id': self.parent_property_id,
-            'address_line_1': self.address_line_1,
-            'address_line_2': self.address_line_2,
-            'city': self.city,
-            'postcode': self.postcode,
-            'latitude': float(self.latitude) if self.latitude else None,
-            'longitude': float(self.longitude) if self.longitude else None,
-            'property_type': self.property_type,
-            'bedrooms': self.bedrooms,
-            'bathrooms': self.bathrooms,
-            'has_parking': self.has_parking,
-            'client_name': self.client_name,
-            'tags': self.tags,
-            'custom_fields': self.custom_fields,
-            'notes': self.notes,
-            'meter_location_notes': self.meter_location_notes,
-            'status': self.status,
-            'is_active': self.is_active,
-            'last_synced_at': self.last_synced_at.isoformat() if self.last_synced_at else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    # Response fields, in order; to_dict() formats _UUIDS and _DTS as strings
+    _FIELDS = ('id', 'inventorybase_id', 'reference_number', 'uprn', 'parent_property_id',
+               'address_line_1', 'address_line_2', 'city', 'postcode', 'latitude', 'longitude',
+               'property_type', 'bedrooms', 'bathrooms', 'has_parking', 'client_name', 'tags',
+               'custom_fields', 'notes', 'meter_location_notes', 'status', 'is_active',
+               'last_synced_at', 'created_at', 'updated_at')
+    _UUIDS = ('id',)
+    _DTS = ('last_synced_at', 'created_at', 'updated_at')
+    
+    # to_raw() leaves UUID/datetime/Decimal values for app.utils.json to encode
+    to_raw = raw_builder(_FIELDS)
+    to_dict = dict_from_raw(_UUIDS, _DTS)
     
     def __repr__(self):
         return f'<Property {self.reference_number or self.id}>'
@@ -1,13 +1,13 @@
 from app import db
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
-from datetime import datetime, timezone
+from app.utils.uuid7 import uuid7
+from app.utils.serialize import dict_builder
 
 class GeneralSettings(db.Model):
     """General settings model matching database_schema.sql SECTION 10"""
     __tablename__ = 'general_settings'
     
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     
     # Company Details
     company_name = db.Column(db.String(255), nullable=False, default='LDN Portal Ltd')
@@ -22,23 +22,14 @@ class GeneralSettings(db.Model):
     postcode = db.Column(db.String(20))
     
     # Timestamps
-    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), server_onupdate=db.FetchedValue())
     
-    def to_dict(self):
-        return {
-            'id': str(self.id),
-            'company_name': self.company_name,
-            'email': self.email,
-            'telephone': self.telephone,
-            'website': self.website,
-            'address_line_1': self.address_line_1,
-            'address_line_2': self.address_line_2,
-            'city': self.city,
-            'postcode': self.postcode,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    _SIMPLE = ('company_name', 'email', 'telephone', 'website',
+               'address_line_1', 'address_line_2', 'city', 'postcode')
+    _UUIDS = ('id',)
+    _DTS = ('created_at', 'updated_at')
+    to_dict = dict_builder(_SIMPLE, _UUIDS, _DTS)
     
     def __repr__(self):
         return f'<GeneralSettings {self.company_name}>'
@@ -1,22 +1,42 @@
 from app import db
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
-from datetime import datetime, timezone
+from app.utils.uuid7 import uuid7
+from app.utils.serialize import dict_builder
+from app.utils.types import Role, RoleType
 
 class User(db.Model):
     """User model matching database_schema.sql SECTION 2"""
     __tablename__ = 'users'
     
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Columns are declared widest-alignment first (uuid/timestamps, doubles,
+    # 2-byte role code, booleans, then variable-length text) so new tables pack
+    # rows without padding between fields.
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
+    
+    # Timestamps
+    # Set by Postgres: now() on insert, set_updated_at trigger on update
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now(), server_onupdate=db.FetchedValue())
+    
+    # Live Location (SOW 3.2)
+    last_location_update = db.Column(db.DateTime(timezone=True))
+    current_lat = db.Column(db.Float(precision=53))
+    current_lng = db.Column(db.Float(precision=53))
+    
+    # smallint code (see Role); loads and compares as 'admin' / 'clerk' / 'agent'
+    role = db.Column(RoleType, nullable=False)
+    
+    # System Access & Availability (SOW 3.2)
+    is_active = db.Column(db.Boolean, default=True)
+    is_on_shift = db.Column(db.Boolean, default=False)
     
     # Authentication (SOW 3.1)
     cognito_sub = db.Column(db.String(255), unique=True, nullable=False, index=True)
     
     # Profile Info
-    email = db.Column(db.String(255), unique=True, nullable=False)
+    email = db.Column(db.String(255), nullable=False)  # unique via ix_users_email_lower
     full_name = db.Column(db.String(100), nullable=False)
     phone_number = db.Column(db.String(20))
-    role = db.Column(db.Enum('admin', 'clerk', 'agent', name='user_role_enum'), nullable=False)
     
     # Address Information (Required for clerks to go on shift)
     address_line_1 = db.Column(db.String(255))
@@ -25,50 +45,45 @@ class User(db.Model):
     postcode = db.Column(db.String(20))
     address_file_url = db.Column(db.Text)
     
-    # System Access & Availability (SOW 3.2)
-    is_active = db.Column(db.Boolean, default=True)
-    is_on_shift = db.Column(db.Boolean, default=False)
-    
-    # Live Location (SOW 3.2)
-    current_lat = db.Column(db.Numeric(10, 8))
-    current_lng = db.Column(db.Numeric(11, 8))
-    last_location_update = db.Column(db.DateTime(timezone=True))
+    # Relationships
+    # Loaded only on access; none are read through the user today. Child rows
+    # whose FK cascades are left to Postgres when a user is deleted.
+    assigned_jobs = db.relationship('Job', foreign_keys='Job.assigned_clerk_id', backref='assigned_clerk', lazy='select')
+    created_jobs = db.relationship('Job', foreign_keys='Job.created_by_user_id', backref='created_by', lazy='select')
+    agent_jobs = db.relationship('Job', foreign_keys='Job.assigned_agent_id', backref='assigned_agent', lazy='select')
+    availability_records = db.relationship('ClerkAvailability', backref='user', lazy='select', cascade='all, delete-orphan', passive_deletes=True)
+    invoices = db.relationship('ClerkInvoice', backref='clerk', lazy='select', cascade='all, delete-orphan', passive_deletes=True)
+    notifications = db.relationship('Notification', backref='user', lazy='select', cascade='all, delete-orphan', passive_deletes=True)
+    chat_messages = db.relationship('ChatMessage', backref='sender', lazy='select', passive_deletes=True)
+    chat_participations = db.relationship('ChatParticipant', backref='user', lazy='select', cascade='all, delete-orphan', passive_deletes=True)
     
-    # Timestamps
-    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    # Indexes
+    # cognito_sub keeps its unique btree: ON CONFLICT (cognito_sub) needs a unique index
+    __table_args__ = (
+        # Auto-assign candidates: clerks currently on shift. The predicate pins
+        # role and is_on_shift, so the key is just id (never updated, which
+        # keeps the frequent location writes HOT); queries must spell out
+        # both conditions as literals to match it (see auto_assign_job)
+        db.Index('ix_users_on_shift_clerks', 'id',
+                 postgresql_where=db.text(f"is_on_shift = true AND role = {Role.CLERK.value}")),
+        # Case-insensitive uniqueness and lookups on email
+        db.Index('ix_users_email_lower', db.func.lower(email), unique=True),
+    )
     
-    # Relationships
-    assigned_jobs = db.relationship('Job', foreign_keys='Job.assigned_clerk_id', backref='assigned_clerk', lazy='dynamic')
-    created_jobs = db.relationship('Job', foreign_keys='Job.created_by_user_id', backref='created_by', lazy='dynamic')
-    agent_jobs = db.relationship('Job', foreign_keys='Job.assigned_agent_id', backref='assigned_agent', lazy='dynamic')
-    availability_records = db.relationship('ClerkAvailability', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-    invoices = db.relationship('ClerkInvoice', backref='clerk', lazy='dynamic', cascade='all, delete-orphan')
-    notifications = db.relationship('Notification', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-    chat_messages = db.relationship('ChatMessage', backref='sender', lazy='dynamic')
-    chat_participations = db.relationship('ChatParticipant', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    @classmethod
+    def by_cognito_sub(cls, cognito_sub, *options):
+        """Look up a user by Cognito sub (unique) with a cached 2.0-style select"""
+        stmt = db.select(cls).where(cls.cognito_sub == cognito_sub)
+        if options:
+            stmt = stmt.options(*options)
+        return db.session.execute(stmt).scalar_one_or_none()
     
-    def to_dict(self):
-        return {
-            'id': str(self.id),
-            'cognito_sub': self.cognito_sub,
-            'email': self.email,
-            'full_name': self.full_name,
-            'phone_number': self.phone_number,
-            'role': self.role,
-            'is_active': self.is_active,
-            'is_on_shift': self.is_on_shift,
-            'address_line_1': self.address_line_1,
-            'address_line_2': self.address_line_2,
-            'city': self.city,
-            'postcode': self.postcode,
-            'address_file_url': self.address_file_url,
-            'current_lat': float(self.current_lat) if self.current_lat else None,
-            'current_lng': float(self.current_lng) if self.current_lng else None,
-            'last_location_update': self.last_location_update.isoformat() if self.last_location_update else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    _SIMPLE = ('cognito_sub', 'email', 'full_name', 'phone_number', 'role', 'is_active', 'is_on_shift',
+               'address_line_1', 'address_line_2', 'city', 'postcode', 'address_file_url',
+               'current_lat', 'current_lng')
+    _UUIDS = ('id',)
+    _DTS = ('last_location_update', 'created_at', 'updated_at')
+    to_dict = dict_builder(_SIMPLE, _UUIDS, _DTS)
     
     def __repr__(self):
         return f'<User {self.email}>'
@@ -1,9 +1,15 @@
 from flask import Blueprint, request, jsonify, current_app
-from app.utils.auth import require_auth, get_current_user, verify_cognito_token
+from app.utils.auth import require_auth, get_current_user, verify_cognito_token, get_cached_claims, get_user_dict, invalidate_user_cache
+from app.utils.json import json_response
 from app import db
 from app.models.user import User
+from app.utils.helpers import invalidate_active_admin_ids
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import boto3
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
+import functools
 import os
 import base64
 import hmac
@@ -13,24 +19,121 @@ import jwt
 
 bp = Blueprint('auth', __name__)
 
+# Cognito settings are read once at import (after load_dotenv in run.py)
+AWS_REGION = os.environ.get('AWS_REGION', 'ap-south-1')
+COGNITO_CLIENT_ID = os.environ.get('COGNITO_CLIENT_ID')
+COGNITO_CLIENT_SECRET = os.environ.get('COGNITO_CLIENT_SECRET')
+COGNITO_USER_POOL_ID = os.environ.get('COGNITO_USER_POOL_ID')
+
+@functools.lru_cache(maxsize=1)
 def get_cognito_client():
-    """Get Cognito Identity Provider client"""
-    region = os.environ.get('AWS_REGION', 'ap-south-1')
-    return boto3.client('cognito-idp', region_name=region)
+    """Get the process-wide Cognito Identity Provider client (boto3 clients are thread-safe)"""
+    return boto3.client(
+        'cognito-idp',
+        region_name=AWS_REGION,
+        config=BotoConfig(max_pool_connections=50, retries={'mode': 'standard', 'max_attempts': 3})
+    )
+
+# Secret-hash inputs, encoded once
+_HMAC_KEY = COGNITO_CLIENT_SECRET.encode('utf-8') if COGNITO_CLIENT_SECRET else None
+_CLIENT_ID_BYTES = (COGNITO_CLIENT_ID or '').encode('utf-8')
 
 def get_secret_hash(username):
     """Calculate secret hash for Cognito client secret"""
-    client_id = os.environ.get('COGNITO_CLIENT_ID')
-    client_secret = os.environ.get('COGNITO_CLIENT_SECRET')
-    if not client_secret:
+    if not _HMAC_KEY:
         return None
-    message = username + client_id
-    dig = hmac.new(
-        client_secret.encode('utf-8'),
-        message.encode('utf-8'),
-        hashlib.sha256
-    ).digest()
-    return base64.b64encode(dig).decode()
+    h = hmac.new(_HMAC_KEY, username.encode('utf-8'), hashlib.sha256)
+    h.update(_CLIENT_ID_BYTES)
+    return base64.b64encode(h.digest()).decode()
+
+# Cognito error code -> (HTTP status, message); anything else is a 400 with Cognito's message
+_COGNITO_ERRORS = {
+    'UserNotFoundException': (404, 'User not found'),
+    'CodeMismatchException': (400, 'Invalid verification code'),
+    'ExpiredCodeException': (400, 'Verification code has expired'),
+    'InvalidPasswordException': (400, 'Password does not meet requirements'),
+    'UsernameExistsException': (400, 'An account with this email already exists'),
+}
+
+# Login only: other flows raise these codes for different reasons (e.g.
+# NotAuthorizedException for "User cannot be confirmed. Current status is
+# CONFIRMED"), where Cognito's own message and a 400 are the right answer
+_LOGIN_COGNITO_ERRORS = {
+    'NotAuthorizedException': (401, 'Incorrect username or password'),
+    'UserNotConfirmedException': (401, 'Please verify your email address'),
+}
+
+def _call_cognito(method_name, username, **params):
+    """Call a Cognito user-pool client method with ClientId/Username/SecretHash filled in"""
+    params['ClientId'] = COGNITO_CLIENT_ID
+    params['Username'] = username
+    secret_hash = get_secret_hash(username)
+    if secret_hash:
+        params['SecretHash'] = secret_hash
+    return getattr(get_cognito_client(), method_name)(**params)
+
+def cognito_error_response(error, overrides=None):
+    """
+    Translate a botocore ClientError into the API's JSON error response.
+    
+    overrides maps extra error codes to (status, message) for one route and
+    takes precedence over _COGNITO_ERRORS.
+    """
+    code = error.response['Error']['Code']
+    mapped = (overrides or {}).get(code) or _COGNITO_ERRORS.get(code)
+    status, message = mapped or (400, error.response['Error']['Message'])
+    return jsonify({'error': message}), status
+
+# E.164: + followed by 1-15 digits
+_E164_RE = re.compile(r'^\+\d{1,15}$')
+_PHONE_STRIP = str.maketrans('', '', ' -()')
+
+def _normalize_phone(raw):
+    """Format a phone number as E.164 (required by Cognito), or None if it isn't valid"""
+    if not raw or not isinstance(raw, str):
+        return None
+    phone = raw.translate(_PHONE_STRIP)
+    if not phone.startswith('+'):
+        phone = '+' + phone
+    return phone if _E164_RE.match(phone) else None
+
+def _attrs_to_dict(attrs):
+    """Cognito [{'Name': ..., 'Value': ...}] attribute list to a dict"""
+    return {attr['Name']: attr['Value'] for attr in attrs}
+
+def upsert_user(values, overwrite=(), fill_blank=()):
+    """
+    Insert a user, or update the one with the same cognito_sub, in a single
+    INSERT ... ON CONFLICT round trip. Caller commits, then calls
+    _drop_cached_user() so no request re-caches the pre-commit row.
+    
+    Args:
+        values: Column values for a new user (must include cognito_sub)
+        overwrite: Columns replaced with the incoming value on conflict
+        fill_blank: Columns set on conflict only when the stored value is NULL/''
+    
+    Returns:
+        The inserted/updated User, or None if the user existed and neither
+        overwrite nor fill_blank was given (the row is left untouched)
+    """
+    stmt = pg_insert(User).values(**values)
+    current = User.__table__.c
+    set_ = {name: stmt.excluded[name] for name in overwrite}
+    for name in fill_blank:
+        set_[name] = func.coalesce(func.nullif(current[name], ''), stmt.excluded[name])
+    if set_:
+        stmt = stmt.on_conflict_do_update(index_elements=[current.cognito_sub], set_=set_)
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[current.cognito_sub])
+    return db.session.scalars(
+        stmt.returning(User),
+        execution_options={'populate_existing': True}
+    ).first()
+
+def _drop_cached_user(cognito_sub):
+    """Drop the cached user dict and admin ids after an upsert_user() commit"""
+    invalidate_user_cache(cognito_sub)
+    invalidate_active_admin_ids()
 
 @bp.route('/signup', methods=['POST'])
 def signup():
@@ -98,7 +201,7 @@ def signup():
             return jsonify({'error': 'Missing required fields'}), 400
         
         client = get_cognito_client()
-        client_id = os.environ.get('COGNITO_CLIENT_ID')
+        client_id = COGNITO_CLIENT_ID
         secret_hash = get_secret_hash(email)
         
         full_name = f"{firstName} {lastName}"
@@ -111,20 +214,10 @@ def signup():
         # Try to add phone number (use standard phone_number attribute)
         # Format phone number to E.164 format (required by Cognito): +[country code][number]
         phone_added = False
-        if phoneNumber:
-            try:
-                # Remove all spaces and ensure it starts with +
-                formatted_phone = phoneNumber.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-                if not formatted_phone.startswith('+'):
-                    formatted_phone = '+' + formatted_phone
-                
-                # Validate E.164 format: + followed by 1-15 digits
-                if re.match(r'^\+\d{1,15}$', formatted_phone):
-                    user_attributes.append({'Name': 'phone_number', 'Value': formatted_phone})
-                    phone_added = True
-            except Exception as e:
-                # If phone formatting fails, skip it
-                pass
+        formatted_phone = _normalize_phone(phoneNumber)
+        if formatted_phone:
+            user_attributes.append({'Name': 'phone_number', 'Value': formatted_phone})
+            phone_added = True
         
         params = {
             'ClientId': client_id,
@@ -190,36 +283,18 @@ def signup():
         # Create user in database immediately with the selected role
         # This ensures role is saved even before email verification
         try:
-            # Check if user already exists (shouldn't happen, but just in case)
-            existing_user = User.query.filter_by(cognito_sub=cognito_sub).first()
-            if not existing_user:
-                # Format phone number if provided
-                formatted_phone = None
-                if phoneNumber:
-                    try:
-                        formatted_phone = phoneNumber.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-                        if not formatted_phone.startswith('+'):
-                            formatted_phone = '+' + formatted_phone
-                        if not re.match(r'^\+\d{1,15}$', formatted_phone):
-                            formatted_phone = None
-                    except:
-                        formatted_phone = None
-                
-                # Create user with selected role
-                new_user = User(
-                    cognito_sub=cognito_sub,
-                    email=email,
-                    full_name=full_name,
-                    phone_number=formatted_phone,
-                    role=role  # Save the role selected during signup
-                )
-                db.session.add(new_user)
-                db.session.commit()
-                current_app.logger.info(f"User created in database: {email} with role: {role}")
-            else:
-                # Update role if user exists
-                existing_user.role = role
-                db.session.commit()
+            # Create user with selected role, or update the role if the user
+            # already exists (shouldn't happen, but just in case)
+            upsert_user({
+                'cognito_sub': cognito_sub,
+                'email': email,
+                'full_name': full_name,
+                'phone_number': formatted_phone,
+                'role': role  # Save the role selected during signup
+            }, overwrite=('role',))
+            db.session.commit()
+            _drop_cached_user(cognito_sub)
+            current_app.logger.info(f"User saved in database: {email} with role: {role}")
         except Exception as db_error:
             # Log error but don't fail signup - role will be set during login
             current_app.logger.error(f"Error creating user in database: {db_error}")
@@ -232,21 +307,17 @@ def signup():
         }), 200
         
     except ClientError as e:
-        error_code = e.response['Error']['Code']
         error_message = e.response['Error']['Message']
         
-        if error_code == 'UsernameExistsException':
-            return jsonify({'error': 'An account with this email already exists'}), 400
-        elif error_code == 'InvalidPasswordException':
-            return jsonify({'error': 'Password does not meet requirements'}), 400
+        if e.response['Error']['Code'] in _COGNITO_ERRORS:
+            return cognito_error_response(e)
         elif 'schema' in error_message.lower() or 'attribute' in error_message.lower():
             return jsonify({
                 'error': 'User Pool configuration error. Custom attributes (custom:role, custom:phone_number) may not be defined in your Cognito User Pool.',
                 'details': error_message,
                 'solution': 'Either add these custom attributes to your Cognito User Pool, or the system will store role in the database only.'
             }), 400
-        else:
-            return jsonify({'error': error_message}), 400
+        return cognito_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -304,7 +375,7 @@ def login():
             return jsonify({'error': 'Email and password are required'}), 400
         
         client = get_cognito_client()
-        client_id = os.environ.get('COGNITO_CLIENT_ID')
+        client_id = COGNITO_CLIENT_ID
         secret_hash = get_secret_hash(email)
         
         params = {
@@ -330,80 +401,42 @@ def login():
         if not id_token:
             return jsonify({'error': 'Authentication failed'}), 401
         
-        # Decode token without verification (we trust Cognito's response)
-        # We'll verify it properly when it's used in subsequent requests
-        try:
-            # Decode without verification to get user info
-            unverified_claims = jwt.decode(id_token, options={"verify_signature": False})
-            cognito_sub = unverified_claims.get('sub')
-            email_from_token = unverified_claims.get('email')
-        except Exception as e:
-            current_app.logger.error(f"Error decoding token: {e}")
-            return jsonify({'error': 'Failed to decode authentication token'}), 401
-        
-        # Verify token properly to ensure it's valid (but don't fail login if this fails)
-        # This is for security - we still trust Cognito's response
+        # Verify and decode the token once; signing keys come from the cached JWKS
         claims = verify_cognito_token(id_token)
         if not claims:
-            # Log warning but continue - token was just issued by Cognito
+            # Token was just issued by Cognito over TLS, so don't fail login;
+            # fall back to reading the claims without verification
             current_app.logger.warning("Token verification failed during login, but continuing with unverified claims")
-            claims = unverified_claims
-        
-        # Get or create user in database
-        user = User.query.filter_by(cognito_sub=cognito_sub).first()
-        
-        if not user:
-            # User doesn't exist - create with role from token or default
-            # Try to get role from token first, then fallback to 'clerk'
-            role = claims.get('custom:role') or 'clerk'
-            full_name = claims.get('name') or email_from_token.split('@')[0]
-            phone_number = claims.get('phone_number') or claims.get('custom:phone_number')
-            
-            user = User(
-                cognito_sub=cognito_sub,
-                email=email_from_token,
-                full_name=full_name,
-                phone_number=phone_number,
-                role=role
-            )
-            db.session.add(user)
-            db.session.commit()
-            current_app.logger.info(f"New user created during login: {email_from_token} with role: {role}")
-        else:
-            # User exists - update info but preserve existing role if it's set
-            # Only update role if it's not set or if token has a different role
-            if not user.email or user.email != email_from_token:
-                user.email = email_from_token
-            if not user.full_name:
-                user.full_name = claims.get('name') or email_from_token.split('@')[0]
-            if not user.phone_number:
-                user.phone_number = claims.get('phone_number') or claims.get('custom:phone_number')
-            
-            # Role handling: preserve existing role from signup, only update if:
-            # 1. User has no role set, OR
-            # 2. Token has custom:role and it's different
-            token_role = claims.get('custom:role')
-            if not user.role:
-                # No role in DB - use token role or default
-                user.role = token_role or 'clerk'
-                current_app.logger.info(f"Setting role for {email_from_token}: {user.role}")
-            elif token_role and token_role != user.role:
-                # Token has role and it's different - update it (admin can change roles)
-                user.role = token_role
-                current_app.logger.info(f"Updating role for {email_from_token} from {user.role} to {token_role}")
-            
-            db.session.commit()
-        
-        # Final check - ensure user role is set (should never reach here, but safety check)
-        if not user.role:
-            user.role = 'clerk'
-            db.session.commit()
-            current_app.logger.warning(f"User {email_from_token} had no role, set to default 'clerk'")
-        
+            try:
+                claims = jwt.decode(id_token, options={"verify_signature": False})
+            except Exception as e:
+                current_app.logger.error(f"Error decoding token: {e}")
+                return jsonify({'error': 'Failed to decode authentication token'}), 401
+        cognito_sub = claims.get('sub')
+        email_from_token = claims.get('email')
+        
+        # Get or create user in database in one statement. Existing users keep
+        # their name/phone unless blank, and keep the role from signup unless
+        # the token carries one (admin can change roles)
+        token_role = claims.get('custom:role')
+        user = upsert_user({
+            'cognito_sub': cognito_sub,
+            'email': email_from_token,
+            'full_name': claims.get('name') or email_from_token.split('@')[0],
+            'phone_number': claims.get('phone_number') or claims.get('custom:phone_number'),
+            'role': token_role or 'clerk'
+        },
+            overwrite=('email', 'role') if token_role else ('email',),
+            fill_blank=('full_name', 'phone_number')
+        )
+        
+        # Serialize before commit, which would expire the row and re-SELECT it
         user_dict = user.to_dict()
-        current_app.logger.info(f"Login successful for user: {user.email}, role: {user.role}")
+        db.session.commit()
+        _drop_cached_user(cognito_sub)
+        current_app.logger.info(f"Login successful for user: {user_dict['email']}, role: {user_dict['role']}")
         
-        return jsonify({
+        return json_response({
             'success': True,
             'idToken': id_token,
             'accessToken': access_token,
@@ -412,17 +445,7 @@ def login():
         }), 200
         
     except ClientError as e:
-        error_code = e.response['Error']['Code']
-        error_message = e.response['Error']['Message']
-        
-        if error_code == 'NotAuthorizedException':
-            return jsonify({'error': 'Incorrect username or password'}), 401
-        elif error_code == 'UserNotConfirmedException':
-            return jsonify({'error': 'Please verify your email address'}), 401
-        elif error_code == 'UserNotFoundException':
-            return jsonify({'error': 'User not found'}), 404
-        else:
-            return jsonify({'error': error_message}), 400
+        return cognito_error_response(e, _LOGIN_COGNITO_ERRORS)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -471,60 +494,40 @@ def confirm_signup():
         if not email or not code:
             return jsonify({'error': 'Email and code are required'}), 400
         
-        client = get_cognito_client()
-        client_id = os.environ.get('COGNITO_CLIENT_ID')
-        secret_hash = get_secret_hash(email)
-        
-        params = {
-            'ClientId': client_id,
-            'Username': email,
-            'ConfirmationCode': code
-        }
-        
-        if secret_hash:
-            params['SecretHash'] = secret_hash
-        
-        client.confirm_sign_up(**params)
+        _call_cognito('confirm_sign_up', email, ConfirmationCode=code)
         
-        # After confirmation, verify user exists in database with role
-        # Get user from Cognito to get cognito_sub
+        # After confirmation, verify user exists in database with role.
+        # Signup normally created the row already, so check locally (via
+        # ix_users_email_lower) before paying for a Cognito round trip.
         try:
-            # Get user details from Cognito
-            admin_client = boto3.client('cognito-idp', region_name=os.environ.get('AWS_REGION', 'ap-south-1'))
-            user_pool_id = os.environ.get('COGNITO_USER_POOL_ID')
-            
-            cognito_user = admin_client.admin_get_user(
-                UserPoolId=user_pool_id,
-                Username=email
-            )
-            
-            cognito_sub = None
-            for attr in cognito_user.get('UserAttributes', []):
-                if attr['Name'] == 'sub':
-                    cognito_sub = attr['Value']
-                    break
-            
-            if cognito_sub:
-                # Check if user exists in database
-                user = User.query.filter_by(cognito_sub=cognito_sub).first()
-                if user:
-                    # User exists - role should already be set from signup
-                    current_app.logger.info(f"User {email} confirmed, role in DB: {user.role}")
-                else:
-                    # User doesn't exist in DB - create with default role
-                    # This shouldn't happen if signup worked, but handle it
-                    role = 'clerk'  # Default
-                    full_name = email.split('@')[0]
-                    
-                    user = User(
-                        cognito_sub=cognito_sub,
-                        email=email,
-                        full_name=full_name,
-                        role=role
-                    )
-                    db.session.add(user)
+            exists = db.session.execute(
+                db.select(User.id).where(func.lower(User.email) == email.lower())
+            ).first()
+            if exists:
+                current_app.logger.info(f"User {email} confirmed")
+            else:
+                # Get user details from Cognito to get cognito_sub
+                cognito_user = get_cognito_client().admin_get_user(
+                    UserPoolId=COGNITO_USER_POOL_ID,
+                    Username=email
+                )
+                cognito_sub = _attrs_to_dict(cognito_user.get('UserAttributes', [])).get('sub')
+                
+                if cognito_sub:
+                    # Create the user with the default role if signup didn't
+                    # (shouldn't happen); an existing user is left untouched
+                    user = upsert_user({
+                        'cognito_sub': cognito_sub,
+                        'email': email,
+                        'full_name': email.split('@')[0],
+                        'role': 'clerk'  # Default
+                    })
                     db.session.commit()
-                    current_app.logger.warning(f"User {email} confirmed but not in DB, created with default role")
+                    _drop_cached_user(cognito_sub)
+                    if user:
+                        current_app.logger.warning(f"User {email} confirmed but not in DB, created with default role")
+                    else:
+                        current_app.logger.info(f"User {email} confirmed")
         except Exception as db_error:
             # Log but don't fail confirmation
             current_app.logger.error(f"Error checking user in database after confirmation: {db_error}")
@@ -535,15 +538,7 @@ def confirm_signup():
         }), 200
         
     except ClientError as e:
-        error_code = e.response['Error']['Code']
-        error_message = e.response['Error']['Message']
-        
-        if error_code == 'CodeMismatchException':
-            return jsonify({'error': 'Invalid verification code'}), 400
-        elif error_code == 'ExpiredCodeException':
-            return jsonify({'error': 'Verification code has expired'}), 400
-        else:
-            return jsonify({'error': error_message}), 400
+        return cognito_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -588,19 +583,7 @@ def resend_code():
         if not email:
             return jsonify({'error': 'Email is required'}), 400
         
-        client = get_cognito_client()
-        client_id = os.environ.get('COGNITO_CLIENT_ID')
-        secret_hash = get_secret_hash(email)
-        
-        params = {
-            'ClientId': client_id,
-            'Username': email
-        }
-        
-        if secret_hash:
-            params['SecretHash'] = secret_hash
-        
-        client.resend_confirmation_code(**params)
+        _call_cognito('resend_confirmation_code', email)
         
         return jsonify({
             'success': True,
@@ -608,9 +591,7 @@ def resend_code():
         }), 200
         
     except ClientError as e:
-        error_code = e.response['Error']['Code']
-        error_message = e.response['Error']['Message']
-        return jsonify({'error': error_message}), 400
+        return cognito_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -655,19 +636,7 @@ def forgot_password():
         if not email:
             return jsonify({'error': 'Email is required'}), 400
         
-        client = get_cognito_client()
-        client_id = os.environ.get('COGNITO_CLIENT_ID')
-        secret_hash = get_secret_hash(email)
-        
-        params = {
-            'ClientId': client_id,
-            'Username': email
-        }
-        
-        if secret_hash:
-            params['SecretHash'] = secret_hash
-        
-        client.forgot_password(**params)
+        _call_cognito('forgot_password', email)
         
         return jsonify({
             'success': True,
@@ -675,13 +644,7 @@ def forgot_password():
         }), 200
         
     except ClientError as e:
-        error_code = e.response['Error']['Code']
-        error_message = e.response['Error']['Message']
-        
-        if error_code == 'UserNotFoundException':
-            return jsonify({'error': 'User not found'}), 404
-        else:
-            return jsonify({'error': error_message}), 400
+        return cognito_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -734,21 +697,7 @@ def confirm_forgot_password():
         if not all([email, code, new_password]):
             return jsonify({'error': 'Email, code, and new password are required'}), 400
         
-        client = get_cognito_client()
-        client_id = os.environ.get('COGNITO_CLIENT_ID')
-        secret_hash = get_secret_hash(email)
-        
-        params = {
-            'ClientId': client_id,
-            'Username': email,
-            'ConfirmationCode': code,
-            'Password': new_password
-        }
-        
-        if secret_hash:
-            params['SecretHash'] = secret_hash
-        
-        client.confirm_forgot_password(**params)
+        _call_cognito('confirm_forgot_password', email, ConfirmationCode=code, Password=new_password)
         
         return jsonify({
             'success': True,
@@ -756,17 +705,7 @@ def confirm_forgot_password():
         }), 200
         
     except ClientError as e:
-        error_code = e.response['Error']['Code']
-        error_message = e.response['Error']['Message']
-        
-        if error_code == 'CodeMismatchException':
-            return jsonify({'error': 'Invalid verification code'}), 400
-        elif error_code == 'ExpiredCodeException':
-            return jsonify({'error': 'Verification code has expired'}), 400
-        elif error_code == 'InvalidPasswordException':
-            return jsonify({'error': 'Password does not meet requirements'}), 400
-        else:
-            return jsonify({'error': error_message}), 400
+        return cognito_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -800,6 +739,21 @@ def verify_token():
             return jsonify({'error': 'Missing authorization header'}), 401
         
         token = auth_header.split(' ')[1] if ' ' in auth_header else auth_header
+        
+        # A token verified recently was already upserted; answer from the caches
+        claims = get_cached_claims(token)
+        if claims is not None:
+            user_dict = get_user_dict(claims.get('sub'))
+            if user_dict:
+                return json_response({
+                    'user': user_dict,
+                    'token_claims': {
+                        'sub': claims.get('sub'),
+                        'email': claims.get('email'),
+                        'exp': claims.get('exp')
+                    }
+                }), 200
+        
         claims = verify_cognito_token(token)
         
         # Add fallback if verification fails (similar to get_current_user)
@@ -816,37 +770,19 @@ def verify_token():
         cognito_sub = claims.get('sub')
         email = claims.get('email')
         
-        user = User.query.filter_by(cognito_sub=cognito_sub).first()
-        
-        if not user:
-            # Create user if doesn't exist
-            role = claims.get('custom:role') or 'clerk'  # Default role
-            full_name = claims.get('name') or email.split('@')[0]
-            phone_number = claims.get('phone_number') or claims.get('custom:phone_number')
-            
-            user = User(
-                cognito_sub=cognito_sub,
-                email=email,
-                full_name=full_name,
-                phone_number=phone_number,
-                role=role
-            )
-            db.session.add(user)
-            db.session.commit()
-        else:
-            # Update user info from token if needed
-            if not user.email or user.email != email:
-                user.email = email
-            if not user.full_name:
-                user.full_name = claims.get('name') or email.split('@')[0]
-            if not user.phone_number:
-                user.phone_number = claims.get('phone_number') or claims.get('custom:phone_number')
-            if not user.role:
-                user.role = claims.get('custom:role') or 'clerk'
-            db.session.commit()
+        user = upsert_user({
+            'cognito_sub': cognito_sub,
+            'email': email,
+            'full_name': claims.get('name') or email.split('@')[0],
+            'phone_number': claims.get('phone_number') or claims.get('custom:phone_number'),
+            'role': claims.get('custom:role') or 'clerk'  # Default role
+        }, overwrite=('email',), fill_blank=('full_name', 'phone_number'))
+        user_dict = user.to_dict()
+        db.session.commit()
+        _drop_cached_user(cognito_sub)
         
         return jsonify({
-            'user': user.to_dict(),
+            'user': user_dict,
             'token_claims': {
                 'sub': claims.get('sub'),
                 'email': claims.get('email'),
@@ -884,12 +820,12 @@ def get_current_user_info():
     """
     try:
         cognito_sub = request.current_user.get('cognito_sub')
-        user = User.query.filter_by(cognito_sub=cognito_sub).first()
+        user_dict = get_user_dict(cognito_sub)
         
-        if not user:
+        if not user_dict:
             return jsonify({'error': 'User not found'}), 404
         
-        return jsonify({'user': user.to_dict()}), 200
+        return json_response({'user': user_dict}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -2,10 +2,47 @@ from flask import Blueprint, request, jsonify
 from app import db
 from app.models.availability import ClerkAvailability
 from app.utils.auth import require_auth, require_role
-from datetime import datetime, time
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.utils.parsers import parse_date, parse_time
+from app.utils.json import json_stream
+import uuid
 
 bp = Blueprint('availability', __name__)
 
+# Columns replaced when a (user_id, available_date) row already exists
+_UPSERT_COLUMNS = ('is_available', 'start_time', 'end_time', 'postcode', 'notes')
+
+def upsert_availability(rows):
+    """
+    Insert or update availability rows keyed on (user_id, available_date) in
+    a single INSERT ... ON CONFLICT statement. Caller commits.
+    
+    Args:
+        rows: Column value dicts, at most one per (user_id, available_date)
+    
+    Returns:
+        The inserted/updated ClerkAvailability objects, in the order of rows
+    """
+    if not rows:
+        return []
+    stmt = pg_insert(ClerkAvailability)
+    stmt = stmt.on_conflict_do_update(
+        constraint='_user_date_uc',
+        set_={name: stmt.excluded[name] for name in _UPSERT_COLUMNS}
+    ).returning(ClerkAvailability)
+    records = db.session.scalars(
+        stmt, rows, execution_options={'populate_existing': True}
+    ).all()
+    
+    # sort_by_parameter_order would make insertmanyvalues send one INSERT per
+    # row (ON CONFLICT rows have no sentinel), so the order is restored here
+    position = {
+        (uuid.UUID(str(row['user_id'])), row['available_date']): i
+        for i, row in enumerate(rows)
+    }
+    records.sort(key=lambda record: position[(record.user_id, record.available_date)])
+    return records
+
 @bp.route('/', methods=['GET'])
 @require_auth
 def get_availability():
@@ -57,18 +94,21 @@ def get_availability():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     
-    query = ClerkAvailability.query
+    # Plain column rows (no ORM objects); their keys match to_dict() and
+    # orjson encodes the UUID/date/time values in the same string forms
+    stmt = db.select(*ClerkAvailability.__table__.c)
     if user_id:
-        query = query.filter_by(user_id=user_id)
+        stmt = stmt.where(ClerkAvailability.user_id == user_id)
     if available_date:
-        query = query.filter_by(available_date=datetime.fromisoformat(available_date).date())
+        stmt = stmt.where(ClerkAvailability.available_date == parse_date(available_date))
     if start_date and end_date:
-        start = datetime.fromisoformat(start_date).date()
-        end = datetime.fromisoformat(end_date).date()
-        query = query.filter(ClerkAvailability.available_date.between(start, end))
+        start = parse_date(start_date)
+        end = parse_date(end_date)
+        stmt = stmt.where(ClerkAvailability.available_date.between(start, end))
     
-    records = query.all()
-    return jsonify([record.to_dict() for record in records]), 200
+    # Rows are fetched and encoded 500 at a time while the response streams
+    rows = db.session.execute(stmt.execution_options(yield_per=500)).mappings()
+    return json_stream(dict(row) for row in rows), 200
 
 @bp.route('/', methods=['POST'])
 @require_auth
@@ -137,43 +177,26 @@ def create_availability():
     
     # Check if this is a bulk save (array of records or object with date keys)
     if isinstance(data, list):
-        # Bulk save from array
-        records = []
+        # Bulk save from array - one upsert for all items; a repeated
+        # (user_id, date) keeps the last item, as the old per-row loop did
+        rows = {}
         for item in data:
-            available_date = datetime.fromisoformat(item['available_date']).date()
-            start_time = time.fromisoformat(item.get('start_time', '08:00:00'))
-            end_time = time.fromisoformat(item.get('end_time', '18:00:00'))
-            
-            # Check if record already exists (upsert behavior)
-            existing = ClerkAvailability.query.filter_by(
-                user_id=item['user_id'],
-                available_date=available_date
-            ).first()
-            
-            if existing:
-                # Update existing record
-                existing.is_available = item.get('is_available', True)
-                existing.start_time = start_time
-                existing.end_time = end_time
-                existing.postcode = item.get('postcode')
-                existing.notes = item.get('notes')
-                records.append(existing)
-            else:
-                # Create new record
-                availability = ClerkAvailability(
-                    user_id=item['user_id'],
-                    available_date=available_date,
-                    is_available=item.get('is_available', True),
-                    start_time=start_time,
-                    end_time=end_time,
-                    postcode=item.get('postcode'),
-                    notes=item.get('notes')
-                )
-                db.session.add(availability)
-                records.append(availability)
+            available_date = parse_date(item['available_date'])
+            rows[(item['user_id'], available_date)] = {
+                'user_id': item['user_id'],
+                'available_date': available_date,
+                'is_available': item.get('is_available', True),
+                'start_time': parse_time(item.get('start_time', '08:00:00')),
+                'end_time': parse_time(item.get('end_time', '18:00:00')),
+                'postcode': item.get('postcode'),
+                'notes': item.get('notes')
+            }
         
+        records = upsert_availability(list(rows.values()))
+        # Serialized before commit, which would expire the records
+        result = [record.to_dict() for record in records]
         db.session.commit()
-        return jsonify([record.to_dict() for record in records]), 201
+        return jsonify(result), 201
     
     elif isinstance(data, dict) and 'availability' in data:
         # Bulk save from object with date keys (frontend format)
@@ -182,59 +205,44 @@ def create_availability():
             return jsonify({'error': 'user_id is required'}), 400
         
         availability_dict = data['availability']
-        records = []
+        rows = []
+        unavailable_dates = []
         
         for date_str, avail_data in availability_dict.items():
+            available_date = parse_date(date_str)
             if not avail_data.get('isAvailable', False):
-                # Skip unavailable dates or delete if exists
-                existing = ClerkAvailability.query.filter_by(
-                    user_id=user_id,
-                    available_date=datetime.fromisoformat(date_str).date()
-                ).first()
-                if existing:
-                    db.session.delete(existing)
+                # Unavailable dates are deleted if they exist
+                unavailable_dates.append(available_date)
                 continue
             
-            available_date = datetime.fromisoformat(date_str).date()
-            start_time = time.fromisoformat(avail_data.get('startTime', '08:00'))
-            end_time = time.fromisoformat(avail_data.get('endTime', '18:00'))
-            
-            # Check if record already exists (upsert behavior)
-            existing = ClerkAvailability.query.filter_by(
-                user_id=user_id,
-                available_date=available_date
-            ).first()
-            
-            if existing:
-                # Update existing record
-                existing.is_available = True
-                existing.start_time = start_time
-                existing.end_time = end_time
-                existing.postcode = avail_data.get('postcode')
-                existing.notes = avail_data.get('notes')
-                records.append(existing)
-            else:
-                # Create new record
-                availability = ClerkAvailability(
-                    user_id=user_id,
-                    available_date=available_date,
-                    is_available=True,
-                    start_time=start_time,
-                    end_time=end_time,
-                    postcode=avail_data.get('postcode'),
-                    notes=avail_data.get('notes')
-                )
-                db.session.add(availability)
-                records.append(availability)
+            rows.append({
+                'user_id': user_id,
+                'available_date': available_date,
+                'is_available': True,
+                'start_time': parse_time(avail_data.get('startTime', '08:00')),
+                'end_time': parse_time(avail_data.get('endTime', '18:00')),
+                'postcode': avail_data.get('postcode'),
+                'notes': avail_data.get('notes')
+            })
         
+        if unavailable_dates:
+            db.session.execute(
+                db.delete(ClerkAvailability)
+                .where(ClerkAvailability.user_id == user_id,
+                       ClerkAvailability.available_date.in_(unavailable_dates))
+                .execution_options(synchronize_session=False)
+            )
+        records = upsert_availability(rows)
+        # Serialized before commit, which would expire the records
+        result = [record.to_dict() for record in records]
         db.session.commit()
-        return jsonify([record.to_dict() for record in records]), 201
+        return jsonify(result), 201
     
     else:
         # Single record creation (original behavior)
-        available_date = datetime.fromisoformat(data['available_date']).date()
-        start_time = time.fromisoformat(data.get('start_time', '08:00:00'))
-        end_time = time.fromisoformat(data.get('end_time', '18:00:00'))
+        available_date = parse_date(data['available_date'])
+        start_time = parse_time(data.get('start_time', '08:00:00'))
+        end_time = parse_time(data.get('end_time', '18:00:00'))
         
         availability = ClerkAvailability(
             user_id=data['user_id'],
@@ -309,13 +317,13 @@ def update_availability(availability_id):
     data = request.get_json()
     
     if 'available_date' in data:
-        availability.available_date = datetime.fromisoformat(data['available_date']).date()
+        availability.available_date = parse_date(data['available_date'])
     if 'is_available' in data:
         availability.is_available = data['is_available']
     if 'start_time' in data:
-        availability.start_time = time.fromisoformat(data['start_time'])
+        availability.start_time = parse_time(data['start_time'])
     if 'end_time' in data:
-        availability.end_time = time.fromisoformat(data['end_time'])
+        availability.end_time = parse_time(data['end_time'])
     if 'postcode' in data:
         availability.postcode = data['postcode']
     if 'notes' in data:
@@ -1,14 +1,141 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, abort
 from app import db
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from app.models.chat import ChatMessage, ChatParticipant
 from app.models.job import Job
 from app.models.user import User
-from app.utils.auth import require_auth
-from app.utils.helpers import create_notification
+from app.utils.auth import require_auth, get_current_user_dict, get_current_user_id
+from app.utils.helpers import create_notifications, get_active_admin_ids
+from app.utils.json import dumps, json_stream
+from app.utils.cache import with_redis
+from app.utils.background import run_in_background
+from app.utils.parsers import parse_datetime
 from datetime import datetime, timezone
+import uuid
 
 bp = Blueprint('chat', __name__)
 
+# Shared-cache entries (see app.utils.cache). Keys carry the job's chat
+# generation, bumped on every new message, so a response computed before
+# the message can never be cached under the current generation. <job_id> is
+# the canonical UUID spelling, whatever form the URL used.
+#   chat:gen:<job_id>             - generation counter
+#   chat:msgs:<job_id>:<gen>      - get_messages response body
+#   chat:unread:<job_id>:<gen>    - hash of user_id -> unread count
+CHAT_CACHE_TTL = 30
+
+# get_messages keyset pages (only when ?before= or ?limit= is given)
+MESSAGES_PAGE_DEFAULT = 50
+MESSAGES_PAGE_MAX = 200
+
+def _parse_message_page(args):
+    """
+    (before, before_id, limit) from get_messages query args.
+    
+    before is the sent_at of the oldest message already shown, before_id its
+    id (the tie-breaker for messages sent in the same instant). Raises
+    ValueError on malformed values.
+    """
+    before = args.get('before')
+    before = parse_datetime(before) if before else None
+    before_id = args.get('before_id')
+    before_id = uuid.UUID(before_id) if before_id else None
+    limit = int(args.get('limit', MESSAGES_PAGE_DEFAULT))
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return before, before_id, min(limit, MESSAGES_PAGE_MAX)
+
+def _cache_job_id(job_id):
+    """Canonical spelling of job_id for cache keys, or None if it isn't a UUID"""
+    try:
+        return str(uuid.UUID(str(job_id)))
+    except ValueError:
+        return None
+
+def _chat_generation(job_id):
+    """Current cache generation for a job's chat, or None without Redis (or for a non-UUID id)"""
+    job_id = _cache_job_id(job_id)
+    if job_id is None:
+        return None
+    return with_redis(lambda r: int(r.get(f'chat:gen:{job_id}') or 0))
+
+def _bump_chat_generation(job_id):
+    job_id = _cache_job_id(job_id)
+    if job_id is None:
+        return
+    def op(r):
+        key = f'chat:gen:{job_id}'
+        r.pipeline().incr(key).expire(key, 86400).execute()
+    with_redis(op)
+
+def _messages_key(job_id, gen):
+    return f'chat:msgs:{_cache_job_id(job_id)}:{gen}'
+
+def _unread_key(job_id, gen):
+    return f'chat:unread:{_cache_job_id(job_id)}:{gen}'
+
+def _set_unread(job_id, gen, user_id, count, replace=True):
+    """
+    Cache a user's unread count. With replace=False an existing entry is kept
+    (HSETNX): a count computed before a concurrent mark_read must not
+    overwrite the 0 that mark_read stored.
+    """
+    def op(r):
+        key = _unread_key(job_id, gen)
+        pipe = r.pipeline()
+        if replace:
+            pipe.hset(key, str(user_id), count)
+        else:
+            pipe.hsetnx(key, str(user_id), count)
+        pipe.expire(key, CHAT_CACHE_TTL).execute()
+    with_redis(op)
+
+def _require_job(job_id):
+    """404 unless the job exists; a SELECT EXISTS on the primary key, no Job row is loaded"""
+    if not db.session.scalar(db.select(db.select(Job.id).where(Job.id == job_id).exists())):
+        abort(404)
+
+def fanout_chat_notifications(job_id, sender_id, sender_name, content):
+    """Notify everyone on a job's chat except the sender (runs in the background)"""
+    job = db.session.get(Job, job_id, options=[db.joinedload(Job.property)])
+    if job is None:
+        return
+    
+    property_address = job.property.address_line_1 if job.property else 'Property'
+    if job.property and job.property.address_line_2:
+        property_address += f", {job.property.address_line_2}"
+    
+    # Determine who should receive notifications (all job participants except sender)
+    notification_recipients = []
+    
+    # Add assigned clerk (if not the sender)
+    if job.assigned_clerk_id and str(job.assigned_clerk_id) != sender_id:
+        notification_recipients.append(job.assigned_clerk_id)
+    
+    # Add assigned agent (if not the sender)
+    if job.assigned_agent_id and str(job.assigned_agent_id) != sender_id:
+        notification_recipients.append(job.assigned_agent_id)
+    
+    # Add all admin users (admins can see all jobs)
+    for admin_id in get_active_admin_ids():
+        if str(admin_id) != sender_id and admin_id not in notification_recipients:
+            notification_recipients.append(admin_id)
+    
+    # Create notifications for all recipients
+    message_preview = content[:100]  # First 100 characters
+    if len(content) > 100:
+        message_preview += '...'
+    
+    create_notifications(
+        notification_recipients,
+        notification_type='CHAT_MESSAGE',
+        title=f'New Message from {sender_name}',
+        body=f'New message in job chat for {property_address}: {message_preview}',
+        job_id=job_id,
+        channel='in_app'
+    )
+    db.session.commit()
+
 @bp.route('/jobs/<job_id>/messages', methods=['GET'])
 @require_auth
 def get_messages(job_id):
@@ -24,43 +151,94 @@ def get_messages(job_id):
         schema:
           type: string
         description: Job ID
+      - in: query
+        name: before
+        schema:
+          type: string
+          format: date-time
+        description: Only messages sent before this time (sent_at of the oldest message already loaded)
+      - in: query
+        name: before_id
+        schema:
+          type: string
+        description: Id of that message, to page through messages sent at the same instant
+      - in: query
+        name: limit
+        schema:
+          type: integer
+        description: Page size (default 50, max 200); without before/limit all messages are returned
     security:
       - Bearer: []
     responses:
       200:
-        description: List of messages
+        description: List of messages, oldest first
         content:
           application/json:
             schema:
               type: array
               items:
                 type: object
+      400:
+        description: Invalid before, before_id or limit
       404:
         description: Job not found
       401:
         description: Unauthorized
     """
-    job = Job.query.get_or_404(job_id)
-    messages = ChatMessage.query.filter_by(job_id=job_id).order_by(ChatMessage.sent_at).all()
+    # Keyset pagination is opt-in; the full history stays the default (and
+    # is the only form that is cached)
+    page = None
+    if 'before' in request.args or 'limit' in request.args:
+        try:
+            page = _parse_message_page(request.args)
+        except ValueError:
+            return jsonify({'error': 'Invalid before, before_id or limit'}), 400
     
-    # Include sender information for each message
-    messages_data = []
-    for msg in messages:
-        msg_dict = msg.to_dict()
-        if msg.sender_id:
-            sender = User.query.get(msg.sender_id)
-            if sender:
-                msg_dict['sender_name'] = sender.full_name
-                msg_dict['sender_role'] = sender.role
-            else:
-                msg_dict['sender_name'] = None
-                msg_dict['sender_role'] = None
-        else:
-            msg_dict['sender_name'] = None
-            msg_dict['sender_role'] = None
-        messages_data.append(msg_dict)
+    gen = _chat_generation(job_id) if page is None else None
+    if gen is not None:
+        cached = with_redis(lambda r: r.get(_messages_key(job_id, gen)))
+        if cached is not None:
+            return current_app.response_class(cached, mimetype='application/json'), 200
     
-    return jsonify(messages_data), 200
+    _require_job(job_id)
+    # Plain column rows with the sender's name/role from the same query; no
+    # ORM objects are built. Messages from deleted users have None for both.
+    stmt = (
+        db.select(*ChatMessage.__table__.c,
+                  User.full_name.label('sender_name'),
+                  User.role.label('sender_role'))
+        .outerjoin(User, User.id == ChatMessage.sender_id)
+        .where(ChatMessage.job_id == job_id)
+    )
+    if page is None:
+        stmt = stmt.order_by(ChatMessage.sent_at)
+    else:
+        # Newest page first, walking ix_chat_msg_job_sent backwards from the
+        # cursor. (sent_at, id) < (before, before_id) is spelled with a plain
+        # sent_at <= bound so the range stays on the index.
+        before, before_id, limit = page
+        if before is not None and before_id is not None:
+            stmt = stmt.where(ChatMessage.sent_at <= before,
+                              db.or_(ChatMessage.sent_at < before, ChatMessage.id < before_id))
+        elif before is not None:
+            stmt = stmt.where(ChatMessage.sent_at < before)
+        stmt = stmt.order_by(ChatMessage.sent_at.desc(), ChatMessage.id.desc()).limit(limit)
+    
+    if page is None and gen is None:
+        # Full history and no cache to fill: fetch and encode 200 rows at a
+        # time while the response streams, instead of building the whole body
+        rows = db.session.execute(stmt.execution_options(yield_per=200)).mappings()
+        return json_stream(dict(row) for row in rows), 200
+    
+    rows = db.session.execute(stmt).mappings()
+    messages_data = [dict(row) for row in rows]
+    if page is not None:
+        messages_data.reverse()  # oldest first, like the full history
+    
+    body = dumps(messages_data)
+    if gen is not None:
+        with_redis(lambda r: r.set(_messages_key(job_id, gen), body, ex=CHAT_CACHE_TTL))
+    return current_app.response_class(body, mimetype='application/json'), 200
 
 @bp.route('/jobs/<job_id>/messages', methods=['POST'])
 @require_auth
@@ -106,84 +284,45 @@ def send_message(job_id):
       401:
         description: Unauthorized
     """
-    job = Job.query.get_or_404(job_id)
+    _require_job(job_id)
     data = request.get_json()
-    current_user = request.current_user
     
     # Get user_id from authenticated user
-    user = User.query.filter_by(cognito_sub=current_user.get('cognito_sub')).first()
+    user = get_current_user_dict()
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
     message = ChatMessage(
         job_id=job_id,
-        sender_id=user.id,
+        sender_id=user['id'],
         content=data.get('content'),
         attachment_url=data.get('attachment_url'),
         is_system_message=data.get('is_system_message', False)
     )
     
     db.session.add(message)
-    db.session.flush()  # Get message.id before commit
-    
-    # Only create notifications for non-system messages
-    is_system_message = data.get('is_system_message', False)
+    db.session.flush()  # Get message.id and sent_at before commit
     
-    if not is_system_message:
-        # Get sender info for notification
-        sender_name = user.full_name if user else 'Someone'
-        property_address = job.property.address_line_1 if job.property else 'Property'
-        if job.property and job.property.address_line_2:
-            property_address += f", {job.property.address_line_2}"
-        
-        # Determine who should receive notifications (all job participants except sender)
-        notification_recipients = []
-        
-        # Add assigned clerk (if not the sender)
-        if job.assigned_clerk_id and job.assigned_clerk_id != user.id:
-            notification_recipients.append(job.assigned_clerk_id)
-        
-        # Add assigned agent (if not the sender)
-        if job.assigned_agent_id and job.assigned_agent_id != user.id:
-            notification_recipients.append(job.assigned_agent_id)
-        
-        # Add all admin users (admins can see all jobs)
-        admin_users = User.query.filter_by(role='admin', is_active=True).all()
-        for admin in admin_users:
-            if admin.id != user.id and admin.id not in notification_recipients:
-                notification_recipients.append(admin.id)
-        
-        # Create notifications for all recipients
-        message_content = data.get('content', '')
-        message_preview = message_content[:100]  # First 100 characters
-        if len(message_content) > 100:
-            message_preview += '...'
-        
-        for recipient_id in notification_recipients:
-            create_notification(
-                user_id=recipient_id,
-                notification_type='CHAT_MESSAGE',
-                title=f'New Message from {sender_name}',
-                body=f'New message in job chat for {property_address}: {message_preview}',
-                job_id=job_id,
-                channel='in_app'
-            )
+    # Include sender information in response (the sender is the current user);
+    # serialized before commit, which would expire the row
+    msg_dict = message.to_dict()
+    msg_dict['sender_name'] = user['full_name']
+    msg_dict['sender_role'] = user['role']
     
     db.session.commit()
+    # Everyone's unread count and the cached message list are now stale
+    _bump_chat_generation(job_id)
     
-    # Include sender information in response
-    msg_dict = message.to_dict()
-    if message.sender_id:
-        sender = User.query.get(message.sender_id)
-        if sender:
-            msg_dict['sender_name'] = sender.full_name
-            msg_dict['sender_role'] = sender.role
-        else:
-            msg_dict['sender_name'] = None
-            msg_dict['sender_role'] = None
-    else:
-        msg_dict['sender_name'] = None
-        msg_dict['sender_role'] = None
+    # Only create notifications for non-system messages; they are written
+    # after the response is on its way, the message row is already committed
+    if not data.get('is_system_message', False):
+        run_in_background(
+            fanout_chat_notifications,
+            job_id=job_id,
+            sender_id=msg_dict['sender_id'],
+            sender_name=msg_dict['sender_name'] or 'Someone',
+            content=data.get('content') or ''
+        )
     
     return jsonify(msg_dict), 201
 
@@ -216,23 +355,32 @@ def mark_read(job_id):
       401:
         description: Unauthorized
     """
-    job = Job.query.get_or_404(job_id)
-    current_user = request.current_user
+    _require_job(job_id)
     
     # Get user_id from authenticated user
-    user = User.query.filter_by(cognito_sub=current_user.get('cognito_sub')).first()
-    if not user:
+    user_id = get_current_user_id()
+    if not user_id:
         return jsonify({'error': 'User not found'}), 404
     
-    participant = ChatParticipant.query.filter_by(job_id=job_id, user_id=user.id).first()
-    if not participant:
-        participant = ChatParticipant(job_id=job_id, user_id=user.id)
-        db.session.add(participant)
-    
-    participant.last_read_at = datetime.now(timezone.utc)
+    # Create or move the read marker in one statement; concurrent marks for
+    # the same (job_id, user_id) can't race into a duplicate-key error
+    stmt = pg_insert(ChatParticipant).values(
+        job_id=job_id, user_id=user_id, last_read_at=datetime.now(timezone.utc)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['job_id', 'user_id'],
+        set_={'last_read_at': stmt.excluded.last_read_at}
+    ).returning(ChatParticipant)
+    participant = db.session.scalars(
+        stmt, execution_options={'populate_existing': True}
+    ).one()
+    participant_dict = participant.to_dict()
     db.session.commit()
+    gen = _chat_generation(job_id)
+    if gen is not None:
+        _set_unread(job_id, gen, user_id, 0)
     
-    return jsonify(participant.to_dict()), 200
+    return jsonify(participant_dict), 200
 
 @bp.route('/jobs/<job_id>/unread-count', methods=['GET'])
 @require_auth
@@ -266,20 +414,96 @@ def get_unread_count(job_id):
       401:
         description: Unauthorized
     """
-    current_user = request.current_user
     
     # Get user_id from authenticated user
-    user = User.query.filter_by(cognito_sub=current_user.get('cognito_sub')).first()
-    if not user:
+    user_id = get_current_user_id()
+    if not user_id:
         return jsonify({'error': 'User not found'}), 404
     
-    participant = ChatParticipant.query.filter_by(job_id=job_id, user_id=user.id).first()
-    last_read = participant.last_read_at if participant else None
+    gen = _chat_generation(job_id)
+    if gen is not None:
+        cached = with_redis(lambda r: r.hget(_unread_key(job_id, gen), user_id))
+        if cached is not None:
+            return jsonify({'unread_count': int(cached)}), 200
     
-    query = ChatMessage.query.filter_by(job_id=job_id)
-    if last_read:
-        query = query.filter(ChatMessage.sent_at > last_read)
-    
-    unread_count = query.count()
+    # One round trip: the read marker is an uncorrelated subquery (evaluated
+    # once), so the count is a range scan on ix_chat_msg_job_sent. No marker
+    # yet means every message is unread.
+    last_read = (db.select(ChatParticipant.last_read_at)
+                 .where(ChatParticipant.job_id == job_id, ChatParticipant.user_id == user_id)
+                 .scalar_subquery())
+    unread_count = db.session.scalar(
+        db.select(db.func.count())
+        .select_from(ChatMessage)
+        .where(ChatMessage.job_id == job_id,
+               ChatMessage.sent_at > db.func.coalesce(last_read, db.cast('-infinity', db.DateTime(timezone=True))))
+    )
+    if gen is not None:
+        _set_unread(job_id, gen, user_id, unread_count, replace=False)
     return jsonify({'unread_count': unread_count}), 200
 
+
+@bp.route('/unread-counts', methods=['GET'])
+@require_auth
+def get_unread_counts():
+    """
+    Get unread message counts for several jobs at once
+    ---
+    tags:
+      - Chat
+    parameters:
+      - in: query
+        name: job_ids
+        required: true
+        schema:
+          type: string
+        description: Comma-separated job IDs
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Unread message count per job
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                unread_counts:
+                  type: object
+                  additionalProperties:
+                    type: integer
+      400:
+        description: Missing or invalid job_ids
+      404:
+        description: User not found
+      401:
+        description: Unauthorized
+    """
+    job_ids = {job_id.strip() for job_id in request.args.get('job_ids', '').split(',') if job_id.strip()}
+    if not job_ids:
+        return jsonify({'error': 'job_ids is required'}), 400
+    try:
+        job_ids = {str(uuid.UUID(job_id)) for job_id in job_ids}
+    except ValueError:
+        return jsonify({'error': 'job_ids must be UUIDs'}), 400
+    
+    # Get user_id from authenticated user
+    user_id = get_current_user_id()
+    if not user_id:
+        return jsonify({'error': 'User not found'}), 404
+    
+    # One GROUP BY for all jobs, each message compared against this user's
+    # read marker for its job (no marker: everything is unread)
+    rows = db.session.execute(
+        db.select(ChatMessage.job_id, db.func.count())
+        .outerjoin(ChatParticipant, db.and_(ChatParticipant.job_id == ChatMessage.job_id,
+                                            ChatParticipant.user_id == user_id))
+        .where(ChatMessage.job_id.in_(job_ids),
+               db.or_(ChatParticipant.last_read_at.is_(None),
+                      ChatMessage.sent_at > ChatParticipant.last_read_at))
+        .group_by(ChatMessage.job_id)
+    ).all()
+    
+    unread_counts = dict.fromkeys(job_ids, 0)
+    unread_counts.update(rows)
+    return jsonify({'unread_counts': unread_counts}), 200
@@ -1,11 +1,41 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, abort
 from app import db
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from app.models.invoice import ClerkInvoice
 from app.utils.auth import require_auth, require_role
-from datetime import datetime, date
+from app.utils.parsers import parse_date
+from app.utils.cache import with_redis
+from app.utils.helpers import strict_query
+import uuid
 
 bp = Blueprint('invoices', __name__)
 
+# Shared-cache entries (see app.utils.cache). Every invoice write bumps the
+# generation, so listings cached before it are never served after it.
+#   invoices:gen                                      - generation counter
+#   invoices:list:<gen>:<clerk_id>:<month_period>     - get_invoices response body
+INVOICES_CACHE_TTL = 60
+
+def _invoices_generation():
+    """Current invoice cache generation, or None without Redis"""
+    return with_redis(lambda r: int(r.get('invoices:gen') or 0))
+
+def _bump_invoices_generation():
+    with_redis(lambda r: r.incr('invoices:gen'))
+
+def _isoformat_sql(column):
+    """
+    column as SQL; timestamptz values rendered like datetime.isoformat()
+    (microseconds only when non-zero, +HH:MM offset) rather than Postgres'
+    JSON form, which drops trailing zeros from the fraction
+    """
+    if not isinstance(column.type, db.DateTime):
+        return column
+    def to_char(fmt):
+        return db.func.to_char(column, fmt, type_=db.Text)
+    fraction = db.case((to_char('US') != '000000', db.literal('.') + to_char('US')), else_='')
+    return to_char('YYYY-MM-DD"T"HH24:MI:SS') + fraction + to_char('TZH:TZM')
+
 @bp.route('/', methods=['GET'])
 @require_auth
 def get_invoices():
@@ -37,20 +67,49 @@ def get_invoices():
               type: array
               items:
                 type: object
+      400:
+        description: Invalid month_period
       401:
         description: Unauthorized
     """
     clerk_id = request.args.get('clerk_id')
     month_period = request.args.get('month_period')
+    if month_period:
+        try:
+            month_date = parse_date(month_period)
+        except ValueError:
+            return jsonify({'error': 'month_period must be a date (YYYY-MM-DD)'}), 400
+    
+    gen = _invoices_generation()
+    cache_key = f"invoices:list:{gen}:{clerk_id or ''}:{month_period or ''}"
+    if gen is not None:
+        cached = with_redis(lambda r: r.get(cache_key))
+        if cached is not None:
+            return current_app.response_class(cached, mimetype='application/json'), 200
     
-    query = ClerkInvoice.query
+    # Postgres builds the whole JSON array (one object per row with the keys
+    # and values of to_dict()), so no ORM objects are loaded or serialized
+    # here; only the whitespace between tokens differs from jsonify().
+    # Cast to text so the driver hands the string over without parsing it.
+    invoices = ClerkInvoice.__table__
+    columns = invoices.c
+    invoice_json = db.func.json_build_object(*[
+        arg
+        for name in ClerkInvoice._SIMPLE + ClerkInvoice._UUIDS + ClerkInvoice._DTS
+        for arg in (db.literal_column(f"'{name}'"), _isoformat_sql(columns[name]))
+    ])
+    stmt = db.select(db.cast(
+        db.func.coalesce(db.func.json_agg(invoice_json), db.literal_column("'[]'::json")), db.Text
+    ))
     if clerk_id:
-        query = query.filter_by(clerk_id=clerk_id)
+        stmt = stmt.where(invoices.c.clerk_id == clerk_id)
     if month_period:
-        query = query.filter_by(month_period=month_period)
+        stmt = stmt.where(invoices.c.month_period == month_date)
     
-    invoices = query.all()
-    return jsonify([invoice.to_dict() for invoice in invoices]), 200
+    body = db.session.scalar(stmt)
+    if gen is not None:
+        with_redis(lambda r: r.set(cache_key, body, ex=INVOICES_CACHE_TTL))
+    return current_app.response_class(body, mimetype='application/json'), 200
 
 @bp.route('/', methods=['POST'])
 @require_auth
@@ -98,7 +157,10 @@ def submit_invoice():
     data = request.get_json()
     
     # Parse month_period (e.g., '2024-11-01' for November 2024)
-    month_period = datetime.fromisoformat(data['month_period']).date()
+    try:
+        month_period = parse_date(data['month_period'])
+    except ValueError:
+        return jsonify({'error': 'month_period must be a date (YYYY-MM-DD)'}), 400
     
     invoice = ClerkInvoice(
         clerk_id=data['clerk_id'],
@@ -109,9 +171,104 @@ def submit_invoice():
     
     db.session.add(invoice)
     db.session.commit()
+    _bump_invoices_generation()
     
     return jsonify(invoice.to_dict()), 201
 
+@bp.route('/batch', methods=['POST'])
+@require_auth
+@require_role('clerk')
+def submit_invoices_batch():
+    """
+    Submit invoices for several month periods at once
+    ---
+    tags:
+      - Invoices
+    security:
+      - Bearer: []
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            required:
+              - invoices
+            properties:
+              invoices:
+                type: array
+                items:
+                  type: object
+                  required:
+                    - clerk_id
+                    - month_period
+                  properties:
+                    clerk_id:
+                      type: string
+                    month_period:
+                      type: string
+                      format: date
+                      description: Month period (YYYY-MM-DD)
+                    invoice_url:
+                      type: string
+    responses:
+      201:
+        description: Invoices submitted; months already submitted are skipped
+        content:
+          application/json:
+            schema:
+              type: array
+              items:
+                type: object
+      400:
+        description: Bad request
+      401:
+        description: Unauthorized
+      403:
+        description: Forbidden (clerk only)
+    """
+    data = request.get_json()
+    items = data.get('invoices') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'invoices must be a non-empty list'}), 400
+    
+    rows = []
+    for item in items:
+        if not isinstance(item, dict) or not item.get('clerk_id') or not item.get('month_period'):
+            return jsonify({'error': 'Each invoice needs clerk_id and month_period'}), 400
+        try:
+            month_period = parse_date(item['month_period'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'month_period must be a date (YYYY-MM-DD)'}), 400
+        rows.append({
+            'clerk_id': item['clerk_id'],
+            'month_period': month_period,
+            'invoice_url': item.get('invoice_url'),
+            'status': 'submitted'
+        })
+    
+    # One multi-row INSERT and one commit for the whole batch; months that
+    # already have an invoice (_clerk_month_uc) are left as they are
+    stmt = (
+        pg_insert(ClerkInvoice)
+        .on_conflict_do_nothing(constraint='_clerk_month_uc')
+        .returning(ClerkInvoice)
+    )
+    invoices = db.session.scalars(stmt, rows).all()
+    
+    # Back in request order; sort_by_parameter_order would have split the
+    # INSERT into one statement per row (ON CONFLICT rows have no sentinel)
+    position = {}
+    for i, row in enumerate(rows):
+        position.setdefault((uuid.UUID(str(row['clerk_id'])), row['month_period']), i)
+    invoices.sort(key=lambda invoice: position[(invoice.clerk_id, invoice.month_period)])
+    invoices_data = [invoice.to_dict() for invoice in invoices]
+    db.session.commit()
+    if invoices_data:
+        _bump_invoices_generation()
+    
+    return jsonify(invoices_data), 201
+
 @bp.route('/<invoice_id>', methods=['PUT'])
 @require_auth
 def update_invoice_status(invoice_id):
@@ -152,16 +309,29 @@ def update_invoice_status(invoice_id):
       401:
         description: Unauthorized
     """
-    invoice = ClerkInvoice.query.get_or_404(invoice_id)
     data = request.get_json()
+    values = {key: data[key] for key in ('status', 'admin_notes') if key in data}
     
-    if 'status' in data:
-        invoice.status = data['status']
-    if 'admin_notes' in data:
-        invoice.admin_notes = data['admin_notes']
+    if values:
+        # UPDATE ... RETURNING: one round trip, no load-then-flush
+        invoice = db.session.scalars(
+            db.update(ClerkInvoice)
+            .where(ClerkInvoice.id == invoice_id)
+            .values(**values)
+            .returning(ClerkInvoice),
+            execution_options={'populate_existing': True}
+        ).one_or_none()
+        if invoice is None:
+            abort(404)
+    else:
+        invoice = strict_query(ClerkInvoice).get_or_404(invoice_id)
     
+    # Serialized before commit, which would expire the row
+    invoice_dict = invoice.to_dict()
     db.session.commit()
-    return jsonify(invoice.to_dict()), 200
+    if values:
+        _bump_invoices_generation()
+    return jsonify(invoice_dict), 200
 
 @bp.route('/check-submission', methods=['GET'])
 @require_auth
@@ -185,6 +355,11 @@ def check_submission():
           type: string
           format: date
         description: Month period (YYYY-MM-DD)
+      - in: query
+        name: exists_only
+        schema:
+          type: boolean
+        description: Return only the submitted flag (no invoice object)
     security:
       - Bearer: []
     responses:
@@ -201,7 +376,7 @@ def check_submission():
                   type: object
                   nullable: true
       400:
-        description: Missing required parameters
+        description: Missing or invalid parameters
       401:
         description: Unauthorized
     """
@@ -211,8 +386,21 @@ def check_submission():
     if not clerk_id or not month_period:
         return jsonify({'error': 'Missing clerk_id or month_period'}), 400
     
-    month_date = datetime.fromisoformat(month_period).date()
-    invoice = ClerkInvoice.query.filter_by(clerk_id=clerk_id, month_period=month_date).first()
+    try:
+        month_date = parse_date(month_period)
+    except ValueError:
+        return jsonify({'error': 'month_period must be a date (YYYY-MM-DD)'}), 400
+    
+    if request.args.get('exists_only', '').lower() in ('1', 'true'):
+        # SELECT EXISTS(...) - answered from the _clerk_month_uc index, no row fetched
+        submitted = db.session.scalar(db.select(
+            db.select(ClerkInvoice.id)
+            .filter_by(clerk_id=clerk_id, month_period=month_date)
+            .exists()
+        ))
+        return jsonify({'submitted': submitted}), 200
+    
+    invoice = strict_query(ClerkInvoice).filter_by(clerk_id=clerk_id, month_period=month_date).first()
     
     return jsonify({
         'submitted': invoice is not None,
@@ -5,12 +5,47 @@ from app.models.property import Property
 from app.models.user import User
 from app.models.assignment_log import AssignmentLog
 from app.models.availability import ClerkAvailability
-from app.utils.auth import require_auth, require_role, get_current_user
-from app.utils.helpers import convert_handover_camel_to_snake, calculate_distance, create_notification
+from app.utils.auth import require_auth, require_role, get_current_user, get_current_user_dict
+from app.utils.helpers import convert_handover_camel_to_snake, calculate_distance, create_notification, create_notifications, get_active_admin_ids, strict_query, keyset_page
+from app.utils.background import run_in_background
+from app.utils.json import json_response
+from app.utils.parsers import parse_datetime, encode_cursor
+from app.utils.types import Role
 from datetime import datetime, date, time, timezone
+from sqlalchemy.orm import selectinload, joinedload
+from cachetools import TTLCache
+from math import radians, cos
+import threading
 
 bp = Blueprint('jobs', __name__)
 
+# property_id -> clerk of the property's most recently completed job (the
+# auto-assign "previous clerk" bonus). complete_job drops the entry in this
+# process; other workers see the change once the entry expires.
+_last_clerk_cache = TTLCache(maxsize=10000, ttl=300)
+_last_clerk_lock = threading.Lock()
+_MISSING = object()
+
+def get_last_completed_clerk_id(property_id):
+    """assigned_clerk_id of the property's latest completed job (None if there is none), cached"""
+    with _last_clerk_lock:
+        clerk_id = _last_clerk_cache.get(property_id, _MISSING)
+    if clerk_id is _MISSING:
+        clerk_id = db.session.scalar(
+            db.select(Job.assigned_clerk_id)
+            .where(Job.property_id == property_id, Job.status == 'completed')
+            .order_by(Job.check_out_at.desc())
+            .limit(1)
+        )
+        with _last_clerk_lock:
+            _last_clerk_cache[property_id] = clerk_id
+    return clerk_id
+
+def invalidate_last_completed_clerk(property_id):
+    """Drop the cached previous clerk after a job at the property completes"""
+    with _last_clerk_lock:
+        _last_clerk_cache.pop(property_id, None)
+
 @bp.route('/', methods=['GET'])
 @require_auth
 def get_jobs():
@@ -84,7 +119,8 @@ def get_jobs():
     agent_id = request.args.get('agent_id')
     property_id = request.args.get('property_id')
     
-    query = Job.query
+    # Batch-load the property and clerk for the whole page instead of one query per job
+    query = strict_query(Job).options(selectinload(Job.property), selectinload(Job.assigned_clerk))
     if status:
         query = query.filter_by(status=status)
     if clerk_id:
@@ -100,18 +136,18 @@ def get_jobs():
     # Include property details for each job
     jobs_data = []
     for job in jobs:
-        job_dict = job.to_dict()
+        job_dict = job.to_raw()
         if job.property:
-            job_dict['property'] = job.property.to_dict()
+            job_dict['property'] = job.property.to_raw()
         # Include assigned clerk details if available
         if job.assigned_clerk:
             job_dict['clerk'] = {
-                'id': str(job.assigned_clerk.id),
+                'id': job.assigned_clerk.id,
                 'name': job.assigned_clerk.full_name
             }
         jobs_data.append(job_dict)
     
-    return jsonify({
+    return json_response({
         'jobs': jobs_data,
         'total': pagination.total,
         'page': page,
@@ -148,24 +184,28 @@ def get_job(job_id):
       401:
         description: Unauthorized
     """
-    job = Job.query.get_or_404(job_id)
-    job_dict = job.to_dict()
+    # Property, clerk and agent are all many-to-one: one SELECT with three LEFT JOINs
+    job = strict_query(Job).options(
+        joinedload(Job.property), joinedload(Job.assigned_clerk), joinedload(Job.assigned_agent)
+    ).get_or_404(job_id)
+    # Raw values; UUIDs and datetimes are encoded by orjson (app.utils.json)
+    job_dict = job.to_raw()
     # Include property details
     if job.property:
-        job_dict['property'] = job.property.to_dict()
+        job_dict['property'] = job.property.to_raw()
     # Include assigned clerk details if available
     if job.assigned_clerk:
         job_dict['clerk'] = {
-            'id': str(job.assigned_clerk.id),
+            'id': job.assigned_clerk.id,
             'name': job.assigned_clerk.full_name
         }
     # Include assigned agent details if available
     if job.assigned_agent:
         job_dict['assigned_agent'] = {
-            'id': str(job.assigned_agent.id),
+            'id': job.assigned_agent.id,
             'full_name': job.assigned_agent.full_name
         }
-    return jsonify(job_dict), 200
+    return json_response(job_dict), 200
 
 def auto_assign_job(job, property_obj):
     """Auto-assign job to best available clerk"""
@@ -179,90 +219,97 @@ def auto_assign_job(job, property_obj):
     today_utc = datetime.now(timezone.utc).date()
     is_today = appointment_date_utc == today_utc
     
-    # Find available clerks
-    query = User.query.filter_by(role='clerk', is_active=True)
+    # Candidates and their scores are computed by Postgres in one query; only
+    # the best clerk's id comes back
+    has_location = db.and_(User.current_lat.isnot(None), User.current_lng.isnot(None))
     
-    # For today's jobs, check is_on_shift
+    # Find available clerks. The clerk role is inlined rather than bound, so
+    # even a generic prepared plan can use the partial ix_users_on_shift_clerks
+    stmt = db.select(User.id).where(
+        User.role == db.literal_column(str(Role.CLERK.value)), User.is_active == db.true()
+    )
     if is_today:
-        query = query.filter_by(is_on_shift=True)
+        # For today's jobs, check is_on_shift and that they have a location
+        stmt = stmt.where(User.is_on_shift == db.true(), has_location)
+    else:
+        # For future dates, check availability calendar
+        stmt = stmt.join(ClerkAvailability, db.and_(
+            ClerkAvailability.user_id == User.id,
+            ClerkAvailability.available_date == appointment_date_utc,
+            ClerkAvailability.is_available == db.true()
+        ))
     
-    clerks = query.all()
+    # Current job count (fewer = higher score, max 20 points); a per-clerk
+    # count on ix_jobs_clerk_status_appt
+    current_jobs = (
+        db.select(db.func.count())
+        .where(Job.assigned_clerk_id == User.id,
+               Job.status.in_(['assigned', 'on_route', 'in_progress']))
+        .scalar_subquery()
+    )
+    score = db.func.greatest(0, 20 - current_jobs)
     
-    if not clerks:
-        return None
+    # Previous clerk bonus (+50 points)
+    previous_clerk_id = get_last_completed_clerk_id(property_obj.id)
+    if previous_clerk_id:
+        score = score + db.case((User.id == previous_clerk_id, 50), else_=0)
     
-    # Filter by availability for future dates
-    available_clerks = []
-    for clerk in clerks:
-        if is_today:
-            # For today, just check if they have location
-            if clerk.current_lat and clerk.current_lng:
-                available_clerks.append(clerk)
-        else:
-            # For future dates, check availability calendar
-            availability = ClerkAvailability.query.filter_by(
-                user_id=clerk.id,
-                available_date=appointment_date_utc,
-                is_available=True
-            ).first()
-            if availability:
-                available_clerks.append(clerk)
+    # Distance score (closer = higher score)
+    if property_obj.latitude and property_obj.longitude:
+        # Haversine distance in km, as in calculate_distance(); the property's
+        # side is computed here once
+        lat1, lon1 = radians(float(property_obj.latitude)), radians(float(property_obj.longitude))
+        lat2, lon2 = db.func.radians(User.current_lat), db.func.radians(User.current_lng)
+        a = (db.func.power(db.func.sin((lat2 - lat1) / 2.0), 2)
+             + cos(lat1) * db.func.cos(lat2) * db.func.power(db.func.sin((lon2 - lon1) / 2.0), 2))
+        distance = 2 * db.func.asin(db.func.least(1.0, db.func.sqrt(a))) * 6371
+        
+        # Inverse distance score (closer = higher, max 100 points)
+        distance_scores = [(has_location, db.func.greatest(0, 100 - distance * 10))]
+        if not is_today:
+            # For future dates, use availability postcode matching as fallback (simplified)
+            distance_scores.append(
+                (db.func.substr(ClerkAvailability.postcode, 1, 4) == property_obj.postcode[:4], 30)
+            )
+        score = score + db.case(*distance_scores, else_=0)
     
-    if not available_clerks:
-        return None
+    # Best score wins; None when no clerk is available
+    return db.session.scalar(stmt.order_by(score.desc()).limit(1))
+
+def reassign_rejected_job(job_id, property_address, appointment_date):
+    """Auto-assign a rejected job to another clerk and notify them (runs in the background)"""
+    job = db.session.get(Job, job_id, options=[joinedload(Job.property)])
+    # Skip if an admin assigned (or cancelled) the job in the meantime
+    if job is None or job.property is None or job.assigned_clerk_id or job.status != 'pending_assignment':
+        return
     
-    # Check for previous clerk at same property
-    previous_job = Job.query.filter_by(
-        property_id=property_obj.id,
-        status='completed'
-    ).order_by(Job.check_out_at.desc()).first()
+    new_clerk_id = auto_assign_job(job, job.property)
+    if not new_clerk_id:
+        return
     
-    # Calculate scores for each clerk
-    clerk_scores = []
-    for clerk in available_clerks:
-        score = 0
-        
-        # Previous clerk bonus (+50 points)
-        if previous_job and previous_job.assigned_clerk_id == clerk.id:
-            score += 50
-        
-        # Distance score (closer = higher score)
-        if property_obj.latitude and property_obj.longitude:
-            if clerk.current_lat and clerk.current_lng:
-                distance = calculate_distance(
-                    float(property_obj.latitude),
-                    float(property_obj.longitude),
-                    float(clerk.current_lat),
-                    float(clerk.current_lng)
-                )
-                # Inverse distance score (closer = higher, max 100 points)
-                score += max(0, 100 - (distance * 10))
-            elif not is_today:
-                # For future dates, use availability postcode if available
-                availability = ClerkAvailability.query.filter_by(
-                    user_id=clerk.id,
-                    available_date=appointment_date_utc
-                ).first()
-                if availability and availability.postcode:
-                    # Use postcode matching as fallback (simplified)
-                    if availability.postcode[:4] == property_obj.postcode[:4]:
-                        score += 30
-        
-        # Current job count (fewer = higher score)
-        current_jobs = Job.query.filter(
-            Job.assigned_clerk_id == clerk.id,
-            Job.status.in_(['assigned', 'on_route', 'in_progress'])
-        ).count()
-        score += max(0, 20 - current_jobs)
-        
-        clerk_scores.append((clerk.id, score))
+    job.assigned_clerk_id = new_clerk_id
+    job.status = 'assigned'
     
-    # Sort by score and return best clerk
-    if not clerk_scores:
-        return None
+    # Log auto-reassignment
+    reassign_log = AssignmentLog(
+        job_id=job.id,
+        previous_clerk_id=None,
+        new_clerk_id=new_clerk_id,
+        action_type='AUTO_ASSIGN',
+        reason='Auto-reassigned after rejection'
+    )
+    db.session.add(reassign_log)
     
-    clerk_scores.sort(key=lambda x: x[1], reverse=True)
-    return clerk_scores[0][0]
+    # Notify new clerk about reassignment
+    create_notification(
+        user_id=new_clerk_id,
+        notification_type='JOB_ASSIGNED',
+        title='Job Reassigned to You',
+        body=f'A job at {property_address} has been reassigned to you. Appointment: {appointment_date}',
+        job_id=job.id,
+        channel='in_app'
+    )
+    db.session.commit()
 
 @bp.route('/', methods=['POST'])
 @require_auth
@@ -341,12 +388,12 @@ def create_job():
     created_by_user_id = None
     assigned_agent_id = None
     if current_user.get('cognito_sub'):
-        user = User.query.filter_by(cognito_sub=current_user['cognito_sub']).first()
+        user = get_current_user_dict()
         if user:
-            created_by_user_id = user.id
+            created_by_user_id = user['id']
             # If the user is an agent, set assigned_agent_id
-            if user.role == 'agent':
-                assigned_agent_id = user.id
+            if user['role'] == 'agent':
+                assigned_agent_id = user['id']
     
     # Create job
     job = Job(
@@ -355,7 +402,7 @@ def create_job():
         assigned_agent_id=assigned_agent_id,
         job_type=data.get('job_type', 'Logistics_Visit'),
         priority=data.get('priority', 'normal'),
-        appointment_date=datetime.fromisoformat(data['appointment_date'].replace('Z', '+00:00')),
+        appointment_date=parse_datetime(data['appointment_date']),
         estimated_duration_minutes=data.get('estimated_duration_minutes', 60),
         access_instructions=data.get('access_instructions'),
         key_location=data.get('key_location'),
@@ -534,17 +581,10 @@ def update_job(job_id):
         if field in data:
             if field == 'appointment_date':
                 # Parse appointment_date with proper timezone handling
-                appointment_date_str = data[field]
-                if 'Z' in appointment_date_str or '+' in appointment_date_str or (appointment_date_str.count('-') > 2 and ':' in appointment_date_str[-6:]):
-                    # Has timezone info
-                    if appointment_date_str.endswith('Z'):
-                        appointment_date_str = appointment_date_str.replace('Z', '+00:00')
-                    appointment_dt = datetime.fromisoformat(appointment_date_str)
-                else:
+                appointment_dt = parse_datetime(data[field])
+                if appointment_dt.tzinfo is None:
                     # No timezone info - assume UTC and add timezone
-                    appointment_dt = datetime.fromisoformat(appointment_date_str)
-                    if appointment_dt.tzinfo is None:
-                        appointment_dt = appointment_dt.replace(tzinfo=timezone.utc)
+                    appointment_dt = appointment_dt.replace(tzinfo=timezone.utc)
                 job.appointment_date = appointment_dt
             else:
                 setattr(job, field, data[field])
@@ -597,7 +637,7 @@ def assign_job(job_id):
       403:
         description: Forbidden (admin only)
     """
-    job = Job.query.get_or_404(job_id)
+    job = Job.query.options(joinedload(Job.property)).get_or_404(job_id)
     data = request.get_json()
     clerk_id = data.get('clerk_id')
     
@@ -747,7 +787,7 @@ def check_in(job_id):
       403:
         description: Forbidden (clerk only)
     """
-    job = Job.query.get_or_404(job_id)
+    job = Job.query.options(joinedload(Job.property)).get_or_404(job_id)
     data = request.get_json()
     
     job.check_in_at = datetime.now(timezone.utc)
@@ -802,12 +842,11 @@ def reject_job(job_id):
       401:
         description: Unauthorized
     """
-    job = Job.query.get_or_404(job_id)
-    current_user = request.current_user
+    job = Job.query.options(joinedload(Job.property)).get_or_404(job_id)
     
     # Verify this clerk is assigned to the job
-    user = User.query.filter_by(cognito_sub=current_user.get('cognito_sub')).first()
-    if not user or job.assigned_clerk_id != user.id:
+    user = get_current_user_dict()
+    if not user or str(job.assigned_clerk_id) != user['id']:
         return jsonify({'error': 'You are not assigned to this job'}), 403
     
     previous_clerk_id = job.assigned_clerk_id
@@ -822,14 +861,14 @@ def reject_job(job_id):
         previous_clerk_id=previous_clerk_id,
         new_clerk_id=None,
         action_type='REJECTION',
-        triggered_by_user_id=user.id,
+        triggered_by_user_id=user['id'],
         reason='Clerk rejected assignment'
     )
     db.session.add(log)
     
     # Notify admin about rejection
     # Get all admin users
-    admin_users = User.query.filter_by(role='admin', is_active=True).all()
+    admin_ids = get_active_admin_ids()
     property_address = job.property.address_line_1 if job.property else 'Property'
     if job.property and job.property.address_line_2:
         property_address += f", {job.property.address_line_2}"
@@ -842,47 +881,32 @@ def reject_job(job_id):
         appointment_date = appointment_dt_utc.strftime('%d/%m/%Y at %H:%M UTC')
     else:
         appointment_date = 'TBD'
-    clerk_name = user.full_name if user else 'Clerk'
-    
-    for admin in admin_users:
-        create_notification(
-            user_id=admin.id,
-            notification_type='JOB_REJECTED',
-            title='Job Rejected',
-            body=f'{clerk_name} has rejected job at {property_address} (Appointment: {appointment_date}). Auto-reassignment in progress.',
-            job_id=job.id,
-            channel='in_app'
-        )
+    clerk_name = user['full_name'] if user else 'Clerk'
     
-    # Try to auto-reassign to another clerk
-    if job.property:
-        new_clerk_id = auto_assign_job(job, job.property)
-        if new_clerk_id:
-            job.assigned_clerk_id = new_clerk_id
-            job.status = 'assigned'
-            
-            # Log auto-reassignment
-            reassign_log = AssignmentLog(
-                job_id=job.id,
-                previous_clerk_id=None,
-                new_clerk_id=new_clerk_id,
-                action_type='AUTO_ASSIGN',
-                reason='Auto-reassigned after rejection'
-            )
-            db.session.add(reassign_log)
-            
-            # Notify new clerk about reassignment
-            create_notification(
-                user_id=new_clerk_id,
-                notification_type='JOB_ASSIGNED',
-                title='Job Reassigned to You',
-                body=f'A job at {property_address} has been reassigned to you. Appointment: {appointment_date}',
-                job_id=job.id,
-                channel='in_app'
-            )
+    create_notifications(
+        admin_ids,
+        notification_type='JOB_REJECTED',
+        title='Job Rejected',
+        body=f'{clerk_name} has rejected job at {property_address} (Appointment: {appointment_date}). Auto-reassignment in progress.',
+        job_id=job.id,
+        channel='in_app'
+    )
     
+    job_dict = job.to_dict()
+    has_property = job.property is not None
     db.session.commit()
-    return jsonify(job.to_dict()), 200
+    
+    # Try to auto-reassign to another clerk once the response is on its way;
+    # the rejection is already committed
+    if has_property:
+        run_in_background(
+            reassign_rejected_job,
+            job_id=job_id,
+            property_address=property_address,
+            appointment_date=appointment_date
+        )
+    
+    return jsonify(job_dict), 200
 
 @bp.route('/<job_id>/complete', methods=['POST'])
 @require_auth
@@ -929,13 +953,12 @@ def complete_job(job_id):
       403:
         description: Forbidden (clerk only)
     """
-    job = Job.query.get_or_404(job_id)
+    job = Job.query.options(joinedload(Job.property)).get_or_404(job_id)
     data = request.get_json()
-    current_user = request.current_user
     
     # Get clerk info
-    user = User.query.filter_by(cognito_sub=current_user.get('cognito_sub')).first()
-    clerk_name = user.full_name if user else 'Clerk'
+    user = get_current_user_dict()
+    clerk_name = user['full_name'] if user else 'Clerk'
     
     job.status = 'completed'
     job.check_out_at = datetime.now(timezone.utc)
@@ -963,16 +986,15 @@ def complete_job(job_id):
         appointment_date = 'TBD'
     
     # Notify admin
-    admin_users = User.query.filter_by(role='admin', is_active=True).all()
-    for admin in admin_users:
-        create_notification(
-            user_id=admin.id,
-            notification_type='JOB_COMPLETED',
-            title='Job Completed',
-            body=f'{clerk_name} has completed job at {property_address} (Appointment: {appointment_date})',
-            job_id=job.id,
-            channel='in_app'
-        )
+    admin_ids = get_active_admin_ids()
+    create_notifications(
+        admin_ids,
+        notification_type='JOB_COMPLETED',
+        title='Job Completed',
+        body=f'{clerk_name} has completed job at {property_address} (Appointment: {appointment_date})',
+        job_id=job.id,
+        channel='in_app'
+    )
     
     # Notify agent if assigned
     if job.assigned_agent_id:
@@ -985,7 +1007,9 @@ def complete_job(job_id):
             channel='in_app'
         )
     
+    property_id = job.property_id
     db.session.commit()
+    invalidate_last_completed_clerk(property_id)
     return jsonify(job.to_dict()), 200
 
 @bp.route('/<job_id>/assignment-logs', methods=['GET'])
@@ -1020,7 +1044,7 @@ def get_job_assignment_logs(job_id):
         description: Unauthorized
     """
     logs = AssignmentLog.query.filter_by(job_id=job_id).order_by(AssignmentLog.created_at.desc()).all()
-    return jsonify([log.to_dict() for log in logs]), 200
+    return jsonify(AssignmentLog.to_dict_bulk(logs)), 200
 
 @bp.route('/assignment-logs', methods=['GET'])
 @require_auth
@@ -1043,6 +1067,11 @@ def get_all_assignment_logs():
           type: integer
           default: 50
         description: Items per page
+      - in: query
+        name: cursor
+        schema:
+          type: string
+        description: Keyset pagination - next_cursor from the previous page, or empty for the first page. Replaces page, and total/pages are omitted
     security:
       - Bearer: []
     responses:
@@ -1065,33 +1094,66 @@ def get_all_assignment_logs():
                   type: integer
                 pages:
                   type: integer
+                next_cursor:
+                  type: string
+      400:
+        description: Invalid cursor
       401:
         description: Unauthorized
     """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
+    cursor = request.args.get('cursor')
     
-    query = AssignmentLog.query.order_by(AssignmentLog.created_at.desc())
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    logs = pagination.items
+    if cursor is not None:
+        # Keyset pagination: seek past the cursor instead of counting and
+        # skipping OFFSET rows
+        try:
+            logs, next_cursor = keyset_page(AssignmentLog.query, AssignmentLog, cursor, max(per_page, 1))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        pagination = None
+    else:
+        query = AssignmentLog.query.order_by(AssignmentLog.created_at.desc(), AssignmentLog.id.desc())
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        logs = pagination.items
+        next_cursor = None
+        if pagination.has_next:
+            next_cursor = encode_cursor(logs[-1].created_at, logs[-1].id)
+    
+    # Include clerk names in response - one id/name query for the whole page
+    clerk_ids = {log.previous_clerk_id for log in logs if log.previous_clerk_id}
+    clerk_ids.update(log.new_clerk_id for log in logs if log.new_clerk_id)
+    clerk_names = {}
+    if clerk_ids:
+        clerk_names = {
+            str(user_id): full_name
+            for user_id, full_name in db.session.execute(
+                db.select(User.id, User.full_name).where(User.id.in_(clerk_ids))
+            )
+        }
     
-    # Include clerk names in response
     logs_data = []
     for log in logs:
         log_dict = log.to_dict()
         if log.previous_clerk_id:
-            prev_clerk = User.query.get(log.previous_clerk_id)
-            log_dict['previous_clerk_name'] = prev_clerk.full_name if prev_clerk else None
+            log_dict['previous_clerk_name'] = clerk_names.get(log.previous_clerk_id)
         if log.new_clerk_id:
-            new_clerk = User.query.get(log.new_clerk_id)
-            log_dict['new_clerk_name'] = new_clerk.full_name if new_clerk else None
+            log_dict['new_clerk_name'] = clerk_names.get(log.new_clerk_id)
         logs_data.append(log_dict)
     
+    if pagination is None:
+        return jsonify({
+            'logs': logs_data,
+            'per_page': per_page,
+            'next_cursor': next_cursor
+        }), 200
     return jsonify({
         'logs': logs_data,
         'total': pagination.total,
         'page': page,
         'per_page': per_page,
-        'pages': pagination.pages
+        'pages': pagination.pages,
+        'next_cursor': next_cursor
     }), 200
 
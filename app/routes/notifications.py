@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify
 from app import db
 from app.models.notification import Notification
-from app.models.user import User
-from app.utils.auth import require_auth
+from app.utils.auth import require_auth, get_current_user_id
+from app.utils.helpers import unread_count_generation, mark_unread_counts_stale, keyset_page, NOTIFICATION_CACHE_TTL
+from app.utils.parsers import encode_cursor
+from app.utils.cache import with_redis
 
 bp = Blueprint('notifications', __name__)
 
@@ -33,6 +35,11 @@ def get_notifications():
           type: string
           default: 'false'
         description: Filter unread notifications only
+      - in: query
+        name: cursor
+        schema:
+          type: string
+        description: Keyset pagination - next_cursor from the previous page, or empty for the first page. Replaces page, and total/pages are omitted
     security:
       - Bearer: []
     responses:
@@ -55,37 +62,58 @@ def get_notifications():
                   type: integer
                 pages:
                   type: integer
+                next_cursor:
+                  type: string
+      400:
+        description: Invalid cursor
       404:
         description: User not found
       401:
         description: Unauthorized
     """
-    current_user = request.current_user
     
     # Get user_id from authenticated user
-    user = User.query.filter_by(cognito_sub=current_user.get('cognito_sub')).first()
-    if not user:
+    user_id = get_current_user_id()
+    if not user_id:
         return jsonify({'error': 'User not found'}), 404
     
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     unread_only = request.args.get('unread_only', 'false').lower() == 'true'
+    cursor = request.args.get('cursor')
     
-    query = Notification.query.filter_by(user_id=user.id)
+    query = Notification.query.filter_by(user_id=user_id)
     if unread_only:
         query = query.filter_by(is_read=False)
     
-    pagination = query.order_by(Notification.created_at.desc()).paginate(
+    if cursor is not None:
+        # Keyset pagination: seek past the cursor instead of counting and
+        # skipping OFFSET rows
+        try:
+            notifications, next_cursor = keyset_page(query, Notification, cursor, max(per_page, 1))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        return jsonify({
+            'notifications': Notification.to_dict_bulk(notifications),
+            'per_page': per_page,
+            'next_cursor': next_cursor
+        }), 200
+    
+    pagination = query.order_by(Notification.created_at.desc(), Notification.id.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     notifications = pagination.items
+    next_cursor = None
+    if pagination.has_next:
+        next_cursor = encode_cursor(notifications[-1].created_at, notifications[-1].id)
     
     return jsonify({
-        'notifications': [notif.to_dict() for notif in notifications],
+        'notifications': Notification.to_dict_bulk(notifications),
         'total': pagination.total,
         'page': page,
         'per_page': per_page,
-        'pages': pagination.pages
+        'pages': pagination.pages,
+        'next_cursor': next_cursor
     }), 200
 
 @bp.route('/<notification_id>/read', methods=['PUT'])
@@ -119,6 +147,7 @@ def mark_notification_read(notification_id):
     """
     notification = Notification.query.get_or_404(notification_id)
     notification.is_read = True
+    mark_unread_counts_stale([notification.user_id])
     db.session.commit()
     return jsonify(notification.to_dict()), 200
 
@@ -147,14 +176,17 @@ def mark_all_read():
       401:
         description: Unauthorized
     """
-    current_user = request.current_user
     
     # Get user_id from authenticated user
-    user = User.query.filter_by(cognito_sub=current_user.get('cognito_sub')).first()
-    if not user:
+    user_id = get_current_user_id()
+    if not user_id:
         return jsonify({'error': 'User not found'}), 404
     
-    Notification.query.filter_by(user_id=user.id, is_read=False).update({'is_read': True})
+    # Nothing in the session is read afterwards, so skip syncing loaded objects
+    Notification.query.filter_by(user_id=user_id, is_read=False).update(
+        {'is_read': True}, synchronize_session=False
+    )
+    mark_unread_counts_stale([user_id])
     db.session.commit()
     return jsonify({'message': 'All notifications marked as read'}), 200
 
@@ -183,13 +215,25 @@ def get_unread_count():
       401:
         description: Unauthorized
     """
-    current_user = request.current_user
     
     # Get user_id from authenticated user
-    user = User.query.filter_by(cognito_sub=current_user.get('cognito_sub')).first()
-    if not user:
+    user_id = get_current_user_id()
+    if not user_id:
         return jsonify({'error': 'User not found'}), 404
     
-    count = Notification.query.filter_by(user_id=user.id, is_read=False).count()
+    gen = unread_count_generation(user_id)
+    if gen is not None:
+        cached = with_redis(lambda r: r.get(f'notif:unread:{user_id}:{gen}'))
+        if cached is not None:
+            return jsonify({'unread_count': int(cached)}), 200
+    
+    # Counted on the partial ix_notifications_unread index
+    count = db.session.scalar(
+        db.select(db.func.count())
+        .select_from(Notification)
+        .where(Notification.user_id == user_id, Notification.is_read == db.false())
+    )
+    if gen is not None:
+        with_redis(lambda r: r.set(f'notif:unread:{user_id}:{gen}', count, ex=NOTIFICATION_CACHE_TTL))
     return jsonify({'unread_count': count}), 200
 
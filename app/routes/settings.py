@@ -120,7 +120,6 @@ def update_general_settings():
     if 'postcode' in data:
         settings.postcode = data.get('postcode')
     
-    settings.updated_at = datetime.now(timezone.utc)
     db.session.commit()
     
     return jsonify({
@@ -267,7 +266,6 @@ def update_inventorybase_integration():
             integration.refresh_token = data['refresh_token']
         if 'token_expires_at' in data:
             integration.token_expires_at = datetime.fromisoformat(data['token_expires_at'])
-        integration.updated_at = datetime.now(timezone.utc)
     else:
         # Create new
         if not all(k in data for k in ['client_id', 'access_token', 'refresh_token']):
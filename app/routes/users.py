@@ -2,7 +2,11 @@ from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
 from app import db
 from app.models.user import User
-from app.utils.auth import require_auth, require_role
+from app.utils.auth import require_auth, require_role, invalidate_user_cache
+from app.utils.helpers import invalidate_active_admin_ids
+from app.utils.location_buffer import record_location
+from app.utils.time import utcnow
+import math
 import os
 import uuid
 from datetime import datetime, timezone
@@ -231,6 +235,9 @@ def update_user(user_id):
         
         # Commit changes
         db.session.commit()
+        invalidate_user_cache(user.cognito_sub)
+        if 'is_active' in data:
+            invalidate_active_admin_ids()
         
         # Refresh the user object to get the latest data including updated_at
         db.session.refresh(user)
@@ -302,20 +309,33 @@ def update_location(user_id):
           application/json:
             schema:
               type: object
+      400:
+        description: Missing or invalid lat/lng
       404:
         description: User not found
       401:
         description: Unauthorized
     """
     user = User.query.get_or_404(user_id)
-    data = request.get_json()
+    data = request.get_json() or {}
+    
+    # Validated here: a bad value in the buffer would fail the whole batched
+    # write for every clerk
+    try:
+        lat, lng = float(data['lat']), float(data['lng'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'lat and lng must be numbers'}), 400
+    if not (math.isfinite(lat) and math.isfinite(lng)):
+        return jsonify({'error': 'lat and lng must be numbers'}), 400
     
-    user.current_lat = data.get('lat')
-    user.current_lng = data.get('lng')
-    user.last_location_update = datetime.utcnow()
+    # Pings are buffered and written in batches by app.utils.location_buffer;
+    # the response reflects the new position straight away
+    ts = utcnow()
+    record_location(user.id, lat, lng, ts)
     
-    db.session.commit()
-    return jsonify(user.to_dict()), 200
+    result = user.to_dict()
+    result.update(current_lat=lat, current_lng=lng, last_location_update=ts.isoformat())
+    return jsonify(result), 200
 
 @bp.route('/<user_id>/upload-address', methods=['POST'])
 @require_auth
@@ -401,6 +421,7 @@ def upload_address_file(user_id):
     # Update user's address file URL
     user.address_file_url = file_url
     db.session.commit()
+    invalidate_user_cache(user.cognito_sub)
     
     return jsonify({
         'message': 'Address file uploaded successfully',
@@ -444,7 +465,10 @@ def delete_user(user_id):
         description: Forbidden (admin only)
     """
     user = User.query.get_or_404(user_id)
+    cognito_sub = user.cognito_sub
     db.session.delete(user)
     db.session.commit()
+    invalidate_user_cache(cognito_sub)
+    invalidate_active_admin_ids()
     return jsonify({'message': 'User deleted successfully'}), 200
 
@@ -1,106 +1,113 @@
 """Authentication utilities and decorators"""
 import os
-import requests
 from functools import wraps
 from flask import request, jsonify, current_app
 import jwt
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.backends import default_backend
+from jwt import PyJWKClient
+from sqlalchemy.orm import raiseload
+from cachetools import TTLCache, TLRUCache
+import hashlib
+import threading
 import time
 
-def get_cognito_public_keys():
-    """Fetch Cognito public keys for JWT verification"""
+# One PyJWKClient per JWKS URL; it caches the key set and signing keys and
+# refetches on its own when a token carries an unknown 'kid'
+_jwk_clients = {}
+
+# cognito_sub -> User.to_dict(); short-lived so role/profile edits made by
+# another worker show up within the 10 second TTL
+_user_cache = TTLCache(maxsize=10000, ttl=10)
+_user_cache_lock = threading.Lock()
+
+def get_user_dict(cognito_sub):
+    """User.to_dict() for a cognito_sub, served from a short TTL cache; None if no user"""
+    with _user_cache_lock:
+        user_dict = _user_cache.get(cognito_sub)
+    if user_dict is not None:
+        return user_dict
+    
+    from app.models.user import User
+    # Only columns are serialized; raise rather than lazy-load relationships
+    user = User.by_cognito_sub(cognito_sub, raiseload('*'))
+    if not user:
+        return None
+    user_dict = user.to_dict()
+    with _user_cache_lock:
+        _user_cache[cognito_sub] = user_dict
+    return user_dict
+
+def invalidate_user_cache(cognito_sub):
+    """Drop a cached user after writing to it"""
+    with _user_cache_lock:
+        _user_cache.pop(cognito_sub, None)
+
+# blake2b(token) -> verified claims, so a token seen recently skips the RSA
+# signature check; entries live 5 minutes at most and never past 'exp'
+_TOKEN_CACHE_TTL = 300
+_token_cache = TLRUCache(
+    maxsize=50000,
+    ttu=lambda key, claims, now: min(now + _TOKEN_CACHE_TTL, claims.get('exp', now)),
+    timer=time.time
+)
+_token_cache_lock = threading.Lock()
+
+def _token_key(token):
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+def get_cached_claims(token):
+    """Claims of a token verified within the last few minutes, or None"""
+    with _token_cache_lock:
+        return _token_cache.get(_token_key(token))
+
+def get_issuer():
+    """Cognito user pool issuer URL, or None if the pool isn't configured"""
     region = current_app.config.get('AWS_REGION') or os.environ.get('AWS_REGION', 'ap-south-1')
     user_pool_id = current_app.config.get('COGNITO_USER_POOL_ID') or os.environ.get('COGNITO_USER_POOL_ID')
-    
     if not user_pool_id:
-        current_app.logger.error("COGNITO_USER_POOL_ID not configured")
-        return None
-    
-    keys_url = f'https://cognito-idp.{region}.amazonaws.com/{user_pool_id}/.well-known/jwks.json'
-    try:
-        response = requests.get(keys_url, timeout=5)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        current_app.logger.error(f"Error fetching Cognito keys: {e}")
         return None
+    return f'https://cognito-idp.{region}.amazonaws.com/{user_pool_id}'
 
-def get_public_key_from_jwk(jwk_data):
-    """Convert JWK to PEM format for PyJWT"""
-    from cryptography.hazmat.primitives.asymmetric import rsa
-    import base64
-    
-    n = base64.urlsafe_b64decode(jwk_data['n'] + '==')
-    e = base64.urlsafe_b64decode(jwk_data['e'] + '==')
-    
-    # Convert bytes to integers
-    n_int = int.from_bytes(n, 'big')
-    e_int = int.from_bytes(e, 'big')
-    
-    # Create RSA public key
-    public_key = rsa.RSAPublicNumbers(e_int, n_int).public_key(default_backend())
-    
-    # Serialize to PEM
-    pem = public_key.public_key_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo
-    )
-    return pem
+def get_jwk_client(issuer):
+    """Get the cached PyJWKClient for a user pool's JWKS"""
+    keys_url = f'{issuer}/.well-known/jwks.json'
+    client = _jwk_clients.get(keys_url)
+    if client is None:
+        client = _jwk_clients.setdefault(
+            keys_url,
+            PyJWKClient(keys_url, cache_keys=True, lifespan=3600, timeout=5)
+        )
+    return client
 
 def verify_cognito_token(token):
     """Verify and decode Cognito JWT token"""
+    claims = get_cached_claims(token)
+    if claims is not None:
+        return claims
+    
     try:
-        # Get public keys
-        keys = get_cognito_public_keys()
-        if not keys:
-            current_app.logger.error("Failed to fetch Cognito public keys")
-            return None
-        
-        # Decode header to get kid (without verification)
-        unverified_header = jwt.get_unverified_header(token)
-        kid = unverified_header.get('kid')
-        if not kid:
-            current_app.logger.error("Token missing 'kid' in header")
-            return None
-        
-        # Find the matching key
-        key_data = None
-        for k in keys.get('keys', []):
-            if k.get('kid') == kid:
-                key_data = k
-                break
-        
-        if not key_data:
-            current_app.logger.error(f"Key with kid '{kid}' not found in JWKS")
+        expected_issuer = get_issuer()
+        if not expected_issuer:
+            current_app.logger.error("COGNITO_USER_POOL_ID not configured")
             return None
         
-        # Convert JWK to PEM format
+        # Resolve the signing key from the token's 'kid' (cached after first use)
         try:
-            public_key_pem = get_public_key_from_jwk(key_data)
-        except Exception as e:
-            current_app.logger.error(f"Error converting JWK to PEM: {e}")
+            signing_key = get_jwk_client(expected_issuer).get_signing_key_from_jwt(token)
+        except jwt.PyJWKClientError as e:
+            current_app.logger.error(f"Could not get signing key: {e}")
             return None
         
-        # Verify token issuer
-        user_pool_id = current_app.config.get('COGNITO_USER_POOL_ID') or os.environ.get('COGNITO_USER_POOL_ID')
-        region = current_app.config.get('AWS_REGION') or os.environ.get('AWS_REGION', 'ap-south-1')
-        
-        if not user_pool_id:
-            current_app.logger.error("COGNITO_USER_POOL_ID not configured")
-            return None
-        
-        expected_issuer = f'https://cognito-idp.{region}.amazonaws.com/{user_pool_id}'
-        
         # Decode and verify token
         try:
             claims = jwt.decode(
                 token,
-                public_key_pem,
+                signing_key.key,
                 algorithms=['RS256'],
                 issuer=expected_issuer,
                 options={"verify_exp": True}
             )
+            with _token_cache_lock:
+                _token_cache[_token_key(token)] = claims
             return claims
         except jwt.ExpiredSignatureError:
             current_app.logger.error("Token has expired")
@@ -151,10 +158,9 @@ def get_current_user():
         # Get role from database instead of token (more reliable)
         role = None
         try:
-            from app.models.user import User
-            user = User.query.filter_by(cognito_sub=cognito_sub).first()
-            if user:
-                role = user.role
+            user_dict = get_user_dict(cognito_sub)
+            if user_dict:
+                role = user_dict['role']
         except Exception as e:
             current_app.logger.warning(f"Could not fetch user from database: {e}")
         
@@ -171,6 +177,20 @@ def get_current_user():
         current_app.logger.error(traceback.format_exc())
         return None
 
+def get_current_user_dict():
+    """
+    Cached User.to_dict() of the authenticated caller (None if no user).
+    
+    require_auth has already loaded it through get_user_dict, so routes that
+    only need the caller's id, name or role don't touch the database.
+    """
+    return get_user_dict(request.current_user.get('cognito_sub'))
+
+def get_current_user_id():
+    """id (string) of the authenticated caller, or None if no user"""
+    user_dict = get_current_user_dict()
+    return user_dict['id'] if user_dict else None
+
 def require_auth(f):
     """Decorator to require authentication"""
     @wraps(f)
@@ -0,0 +1,30 @@
+"""Run follow-up work (e.g. notification fan-out) off the request thread"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Shared by all requests in this process; tasks are short DB writes
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='background')
+
+
+def run_in_background(fn, *args, **kwargs):
+    """
+    Call fn(*args, **kwargs) on a worker thread inside an app context.
+    
+    The task gets its own session, so commit anything it reads before
+    submitting it. Errors are logged and rolled back; nothing is retried.
+    """
+    app = current_app._get_current_object()
+    
+    def task():
+        with app.app_context():
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Background task {fn.__name__} failed: {e}")
+    
+    return _executor.submit(task)
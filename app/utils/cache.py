@@ -0,0 +1,46 @@
+"""
+Optional shared cache backed by Redis.
+
+Enabled by setting REDIS_URL. Without it get_redis() returns None and every
+cached read falls through to the database; redis is only imported when a URL
+is configured. Cache errors are logged and treated as misses, never failures.
+"""
+import logging
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# One client (with its own connection pool) per Redis URL
+_clients = {}
+
+
+def get_redis():
+    """Redis client for REDIS_URL, or None when no Redis is configured"""
+    url = current_app.config.get('REDIS_URL')
+    if not url:
+        return None
+    client = _clients.get(url)
+    if client is None:
+        import redis
+        client = _clients.setdefault(
+            url,
+            redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        )
+    return client
+
+
+def with_redis(op, default=None):
+    """
+    Run op(client) against the shared cache.
+    
+    Returns default when Redis is not configured or the call fails, so
+    callers can treat the result as a cache miss.
+    """
+    client = get_redis()
+    if client is None:
+        return default
+    try:
+        return op(client)
+    except Exception as e:
+        logger.warning(f"Redis cache error: {e}")
+        return default
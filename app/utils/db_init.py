@@ -5,6 +5,11 @@ This module handles automatic creation of:
 - PostgreSQL extensions
 - Custom ENUM types
 - All database tables
+- Server-side column defaults on existing tables
+- Indexes added to models after their table was created
+- numeric -> double precision conversion for columns now declared as Float
+- user_role_enum -> smallint conversion of users.role
+- BEFORE UPDATE triggers keeping updated_at current
 
 All operations are idempotent - they won't fail if objects already exist.
 """
@@ -31,10 +36,6 @@ def create_postgres_extensions():
 def create_enums():
     """Create PostgreSQL ENUM types if they don't exist"""
     enums = [
-        {
-            'name': 'user_role_enum',
-            'values': ['admin', 'clerk', 'agent']
-        },
         {
             'name': 'priority_enum',
             'values': ['low', 'normal', 'high', 'emergency']
@@ -89,6 +90,157 @@ def create_all_tables():
         raise
 
 
+def apply_server_defaults():
+    """
+    Sync server-side column defaults onto existing tables.
+    
+    db.create_all() does not alter tables that already exist, so columns whose
+    default moved from Python to the database (e.g. created_at -> now()) would
+    otherwise insert NULL on databases created before the change.
+    """
+    dialect = db.engine.dialect
+    for table in db.metadata.sorted_tables:
+        for column in table.columns:
+            if column.server_default is None:
+                continue
+            default = column.server_default.arg
+            if isinstance(default, str):
+                default_sql = "'" + default.replace("'", "''") + "'"
+            else:
+                default_sql = str(default.compile(dialect=dialect))
+            try:
+                db.session.execute(text(
+                    f'ALTER TABLE {table.name} ALTER COLUMN {column.name} SET DEFAULT {default_sql}'
+                ))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Could not set default for {table.name}.{column.name}: {e}")
+    logger.info("Server-side column defaults verified successfully")
+
+
+def create_missing_indexes():
+    """
+    Create model indexes that are missing on existing tables.
+    
+    Like defaults, indexes declared after a table already exists (composite and
+    partial indexes in __table_args__) are skipped by db.create_all().
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=db.engine, checkfirst=True)
+            except Exception as e:
+                logger.warning(f"Could not create index {index.name}: {e}")
+    logger.info("Table indexes verified successfully")
+
+
+def convert_numeric_to_float():
+    """
+    Convert legacy numeric columns to double precision where the model now
+    declares db.Float (e.g. lat/lng). Columns already converted are skipped.
+    """
+    for table in db.metadata.sorted_tables:
+        for column in table.columns:
+            if not isinstance(column.type, db.Float):
+                continue
+            try:
+                data_type = db.session.execute(text(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_name = :table AND column_name = :column"
+                ), {'table': table.name, 'column': column.name}).scalar()
+                if data_type != 'numeric':
+                    continue
+                db.session.execute(text(
+                    f'ALTER TABLE {table.name} ALTER COLUMN {column.name} '
+                    f'TYPE double precision USING {column.name}::double precision'
+                ))
+                db.session.commit()
+                logger.info(f"Converted {table.name}.{column.name} to double precision")
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Could not convert {table.name}.{column.name}: {e}")
+
+
+def convert_role_to_smallint():
+    """
+    Convert users.role from the legacy user_role_enum to its smallint code
+    (see app.utils.types.Role) and drop the enum type. Runs before index
+    creation: the on-shift clerks index predicate compares role to a code.
+    """
+    from app.utils.types import Role
+    try:
+        data_type = db.session.execute(text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_name = 'users' AND column_name = 'role'"
+        )).scalar()
+        if data_type == 'USER-DEFINED':
+            cases = ' '.join(f"WHEN '{role.name.lower()}' THEN {role.value}" for role in Role)
+            # The old partial index compares role to an enum literal; it is
+            # recreated against the smallint code by create_missing_indexes()
+            db.session.execute(text('DROP INDEX IF EXISTS ix_users_on_shift_clerks'))
+            db.session.execute(text(
+                f'ALTER TABLE users ALTER COLUMN role TYPE smallint USING CASE role::text {cases} END'
+            ))
+            logger.info("Converted users.role to smallint")
+        db.session.execute(text('DROP TYPE IF EXISTS user_role_enum'))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Could not convert users.role to smallint: {e}")
+
+
+def drop_outdated_indexes():
+    """
+    Drop indexes whose definition has changed since they were created, so
+    create_missing_indexes() (which only checks names) builds them again.
+    """
+    # ix_users_on_shift_clerks used to be keyed on (role, is_on_shift)
+    try:
+        indexdef = db.session.execute(text(
+            "SELECT indexdef FROM pg_indexes WHERE indexname = 'ix_users_on_shift_clerks'"
+        )).scalar()
+        if indexdef and '(id)' not in indexdef:
+            db.session.execute(text('DROP INDEX ix_users_on_shift_clerks'))
+            logger.info("Dropped outdated index ix_users_on_shift_clerks")
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Could not check outdated indexes: {e}")
+
+
+def create_updated_at_triggers():
+    """
+    Install a BEFORE UPDATE trigger on every table with an updated_at column.
+    
+    The models declare updated_at as server-maintained (server_onupdate), so
+    the ORM sends no timestamp on UPDATE and raw SQL writes stay correct too.
+    """
+    try:
+        db.session.execute(text("""
+            CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+            BEGIN
+                NEW.updated_at = now();
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+        for table in db.metadata.sorted_tables:
+            if 'updated_at' not in table.columns:
+                continue
+            trigger = f'{table.name}_updated_at'
+            db.session.execute(text(f'DROP TRIGGER IF EXISTS {trigger} ON {table.name}'))
+            db.session.execute(text(
+                f'CREATE TRIGGER {trigger} BEFORE UPDATE ON {table.name} '
+                f'FOR EACH ROW EXECUTE FUNCTION set_updated_at()'
+            ))
+        db.session.commit()
+        logger.info("updated_at triggers created/verified successfully")
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Could not create updated_at triggers: {e}")
+
+
 def initialize_database():
     """
     Main initialization function that sets up the entire database.
@@ -106,6 +258,23 @@ def initialize_database():
         # Step 3: Create all tables
         create_all_tables()
         
+        # Step 4: Sync server-side defaults onto existing tables
+        apply_server_defaults()
+        
+        # Step 5: Convert users.role from the legacy ENUM to smallint
+        convert_role_to_smallint()
+        
+        # Step 6: Create indexes missing on existing tables (indexes whose
+        # definition changed are dropped first and rebuilt)
+        drop_outdated_indexes()
+        create_missing_indexes()
+        
+        # Step 7: Convert numeric columns now declared as Float
+        convert_numeric_to_float()
+        
+        # Step 8: Maintain updated_at in the database
+        create_updated_at_triggers()
+        
         logger.info("Database initialization completed successfully!")
         return True
     except Exception as e:
@@ -1,9 +1,21 @@
 """Helper utility functions"""
 from math import radians, cos, sin, asin, sqrt
 import re
+from functools import lru_cache
+import threading
+from cachetools import TTLCache
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, raiseload
 from app import db
+from app.utils.cache import with_redis
+from app.utils.parsers import decode_cursor, encode_cursor
 from app.models.notification import Notification
 
+# Active admin ids, re-read at most once a minute; admins change rarely
+_admin_ids_cache = TTLCache(maxsize=1, ttl=60)
+_admin_ids_lock = threading.Lock()
+
 def calculate_distance(lat1, lon1, lat2, lon2):
     """
     Calculate the great circle distance between two points
@@ -32,18 +44,40 @@ def validate_coordinates(lat, lng):
         return False
     return True
 
+_CAMEL_WORD = re.compile('(.)([A-Z][a-z]+)')
+_CAMEL_BOUNDARY = re.compile('([a-z0-9])([A-Z])')
+
+@lru_cache(maxsize=1024)
 def camel_to_snake(name):
     """Convert camelCase to snake_case"""
     # Insert an underscore before any uppercase letter that follows a lowercase letter or digit
-    s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
+    s1 = _CAMEL_WORD.sub(r'\1_\2', name)
     # Insert an underscore before any uppercase letter that follows a lowercase letter
-    return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
+    return _CAMEL_BOUNDARY.sub(r'\1_\2', s1).lower()
 
+@lru_cache(maxsize=1024)
 def snake_to_camel(name):
     """Convert snake_case to camelCase"""
     components = name.split('_')
     return components[0] + ''.join(x.capitalize() for x in components[1:])
 
+# Known handover keys, looked up directly; any other key goes through the
+# memoized converters above
+HANDOVER_CAMEL_TO_SNAKE = {
+    'gasReading': 'gas_reading',
+    'electricReading': 'electric_reading',
+    'keyReturn': 'key_return_info',
+    'proofPhotoUrl': 'proof_photo_url'
+}
+
+HANDOVER_SNAKE_TO_CAMEL = {
+    'gas_reading': 'gasReading',
+    'electric_reading': 'electricReading',
+    'key_return_info': 'keyReturn',
+    'key_return': 'keyReturn',  # Alternative field name
+    'proof_photo_url': 'proofPhotoUrl'
+}
+
 def convert_handover_camel_to_snake(data):
     """
     Convert handover_data from frontend camelCase format to database snake_case format.
@@ -54,21 +88,9 @@ def convert_handover_camel_to_snake(data):
     if not isinstance(data, dict):
         return data
     
-    converted = {}
-    # Mapping from frontend camelCase to database snake_case
-    field_mapping = {
-        'gasReading': 'gas_reading',
-        'electricReading': 'electric_reading',
-        'keyReturn': 'key_return_info',
-        'proofPhotoUrl': 'proof_photo_url'
-    }
-    
-    for key, value in data.items():
-        # Use mapping if available, otherwise convert using camel_to_snake
-        db_key = field_mapping.get(key, camel_to_snake(key))
-        converted[db_key] = value
-    
-    return converted
+    # Use mapping if available, otherwise convert using camel_to_snake
+    mapped = HANDOVER_CAMEL_TO_SNAKE.get
+    return {mapped(key) or camel_to_snake(key): value for key, value in data.items()}
 
 def convert_handover_snake_to_camel(data):
     """
@@ -80,22 +102,100 @@ def convert_handover_snake_to_camel(data):
     if not isinstance(data, dict):
         return data
     
-    converted = {}
-    # Mapping from database snake_case to frontend camelCase
-    field_mapping = {
-        'gas_reading': 'gasReading',
-        'electric_reading': 'electricReading',
-        'key_return_info': 'keyReturn',
-        'key_return': 'keyReturn',  # Alternative field name
-        'proof_photo_url': 'proofPhotoUrl'
-    }
+    # Use mapping if available, otherwise convert using snake_to_camel
+    mapped = HANDOVER_SNAKE_TO_CAMEL.get
+    return {mapped(key) or snake_to_camel(key): value for key, value in data.items()}
+
+def strict_query(model):
+    """
+    model.query that raises on any lazy relationship load when the
+    RAISE_ON_LAZY_LOAD config flag is set (development and testing), so a
+    to_dict() that starts touching a relationship shows up as an error
+    instead of a silent query per row. A plain model.query otherwise.
+    """
+    query = model.query
+    if current_app.config.get('RAISE_ON_LAZY_LOAD'):
+        query = query.options(raiseload('*'))
+    return query
+
+def keyset_page(query, model, cursor, per_page):
+    """
+    One page of query, newest first, after the row cursor points at.
+    
+    Rows are ordered by (created_at, id) descending and the page starts with
+    a seek on that pair instead of an OFFSET, so deep pages cost the same as
+    the first. cursor is an app.utils.parsers.encode_cursor() value, or
+    empty for the first page. Returns (rows, next_cursor); next_cursor is
+    None on the last page. Raises ValueError on a malformed cursor.
+    """
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(db.tuple_(model.created_at, model.id) < (created_at, row_id))
+    rows = query.limit(per_page).all()
+    next_cursor = None
+    if len(rows) == per_page:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+def get_active_admin_ids():
+    """
+    Ids of all active admin users (notification recipients)
     
-    for key, value in data.items():
-        # Use mapping if available, otherwise convert using snake_to_camel
-        frontend_key = field_mapping.get(key, snake_to_camel(key))
-        converted[frontend_key] = value
+    Only the id column is selected and the result is cached for 60 seconds;
+    call invalidate_active_admin_ids() after changing a user's role/is_active.
+    """
+    with _admin_ids_lock:
+        admin_ids = _admin_ids_cache.get('admins')
+    if admin_ids is None:
+        from app.models.user import User
+        admin_ids = tuple(db.session.scalars(
+            db.select(User.id).where(User.role == 'admin', User.is_active.is_(True))
+        ))
+        with _admin_ids_lock:
+            _admin_ids_cache['admins'] = admin_ids
+    return admin_ids
+
+def invalidate_active_admin_ids():
+    """Drop the cached admin ids so the next lookup re-reads them"""
+    with _admin_ids_lock:
+        _admin_ids_cache.clear()
+
+# Shared-cache unread notification counts (see app.utils.cache), per user.
+# The generation is bumped only after the transaction that adds or reads the
+# user's notifications commits, so a count computed before that commit is
+# never served after it.
+#   notif:gen:<user_id>             - generation counter
+#   notif:unread:<user_id>:<gen>    - unread count
+NOTIFICATION_CACHE_TTL = 60
+_STALE_UNREAD_KEY = 'stale_unread_user_ids'
+
+def unread_count_generation(user_id):
+    """Current unread-count cache generation for a user, or None without Redis"""
+    return with_redis(lambda r: int(r.get(f'notif:gen:{user_id}') or 0))
+
+def mark_unread_counts_stale(user_ids):
+    """Invalidate the users' cached unread counts when the current transaction commits"""
+    db.session.info.setdefault(_STALE_UNREAD_KEY, set()).update(str(user_id) for user_id in user_ids)
+
+@event.listens_for(Session, 'after_commit')
+def _bump_unread_generations(session):
+    user_ids = session.info.pop(_STALE_UNREAD_KEY, None)
+    if not user_ids:
+        return
     
-    return converted
+    def op(r):
+        pipe = r.pipeline()
+        for user_id in user_ids:
+            key = f'notif:gen:{user_id}'
+            pipe.incr(key).expire(key, 86400)
+        pipe.execute()
+    with_redis(op)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_unread_generations(session):
+    session.info.pop(_STALE_UNREAD_KEY, None)
 
 def create_notification(user_id, notification_type, title, body, job_id=None, channel='in_app'):
     """
@@ -123,5 +223,31 @@ def create_notification(user_id, notification_type, title, body, job_id=None, ch
         is_read=False
     )
     db.session.add(notification)
+    mark_unread_counts_stale([user_id])
     return notification
 
+
+def create_notifications(user_ids, notification_type, title, body, job_id=None, channel='in_app'):
+    """
+    Create the same notification for several users in one bulk INSERT
+    
+    Unlike create_notification(), no ORM objects are built or added to the
+    session; the rows are written immediately (caller commits).
+    
+    Args:
+        user_ids: UUIDs of the users to notify
+        notification_type, title, body, job_id, channel: As for create_notification()
+    """
+    rows = [{
+        'user_id': user_id,
+        'related_job_id': job_id,
+        'type': notification_type,
+        'title': title,
+        'body': body,
+        'channel': channel,
+        'delivery_status': 'sent',
+        'is_read': False
+    } for user_id in user_ids]
+    if rows:
+        db.session.execute(db.insert(Notification), rows)
+        mark_unread_counts_stale(user_ids)
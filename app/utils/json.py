@@ -0,0 +1,71 @@
+"""Fast JSON responses backed by orjson"""
+from decimal import Decimal
+from flask import current_app, stream_with_context
+from flask.json.provider import JSONProvider
+import orjson
+
+
+def _default(obj):
+    """Fallback for types orjson does not encode natively"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps(obj):
+    """
+    Serialize to JSON bytes.
+    
+    UUID, datetime, date and time are encoded natively by orjson, so models can
+    hand over raw column values (see to_raw()) instead of pre-formatting them.
+    """
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS)
+
+
+def json_response(obj):
+    """Build a JSON response without going through jsonify()"""
+    return current_app.response_class(dumps(obj), mimetype='application/json')
+
+
+def json_stream(items, chunk_size=500):
+    """
+    Stream an iterable as a JSON array response.
+    
+    Elements are encoded as they are produced (e.g. from query.yield_per())
+    and written out chunk_size at a time, so neither the full result list
+    nor the full body is held in memory. The request context stays open
+    until the stream is exhausted.
+    """
+    def generate():
+        sep = b'['
+        buf = []
+        for item in items:
+            buf.append(dumps(item))
+            if len(buf) >= chunk_size:
+                yield sep + b','.join(buf)
+                sep, buf = b',', []
+        if buf:
+            yield sep + b','.join(buf)
+            sep = b','
+        yield b'[]' if sep == b'[' else b']'
+    
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/json')
+
+
+class ORJSONProvider(JSONProvider):
+    """
+    app.json provider using orjson for jsonify() and request.get_json().
+    
+    response() writes the encoded bytes straight into the body instead of
+    decoding to str and re-encoding as the default provider does.
+    """
+    
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype='application/json')
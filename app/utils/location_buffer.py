@@ -0,0 +1,134 @@
+"""
+Buffer for live GPS pings from on-shift clerks.
+
+Pings only overwrite the latest (lat, lng, ts) per user in memory; a daemon
+thread writes everything buffered every LOCATION_FLUSH_INTERVAL seconds as a
+single UPDATE users ... FROM (VALUES ...) statement, so a fleet of clerks costs
+one round-trip per interval instead of one UPDATE per ping.
+"""
+import atexit
+import logging
+import threading
+from sqlalchemy import Float, DateTime, cast, column, update, values
+from sqlalchemy.exc import DataError
+from sqlalchemy.dialects.postgresql import UUID
+from app import db
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_latest = {}  # user_id -> (lat, lng, ts); later pings replace earlier ones
+_state = {'app': None, 'interval': 2.0, 'thread': None}
+
+
+def init_location_buffer(app):
+    """Remember the app for the flush thread; the thread starts on the first ping"""
+    _state['app'] = app
+    _state['interval'] = float(app.config.get('LOCATION_FLUSH_INTERVAL', 2.0))
+
+
+def record_location(user_id, lat, lng, ts):
+    """Buffer a user's latest position; written to the users row on the next flush"""
+    with _lock:
+        _latest[str(user_id)] = (lat, lng, ts)
+        if _state['thread'] is None:
+            _start_flusher()
+
+
+def _start_flusher():
+    thread = threading.Thread(target=_run, name='location-flush', daemon=True)
+    _state['thread'] = thread
+    thread.start()
+    atexit.register(flush_locations)
+
+
+def _run():
+    stop = threading.Event()
+    while not stop.wait(_state['interval']):
+        try:
+            flush_locations()
+        except Exception as e:
+            # Keep the thread alive; pings that failed are retried next interval
+            # unless a newer ping for the same user has replaced them
+            logger.error(f"Location flush failed: {e}")
+
+
+def _take_pending():
+    global _latest
+    with _lock:
+        pending, _latest = _latest, {}
+    return pending
+
+
+def _restore(pending):
+    with _lock:
+        for user_id, loc in pending.items():
+            _latest.setdefault(user_id, loc)
+
+
+def flush_locations():
+    """Write all buffered pings in one UPDATE; returns the number of users written"""
+    pending = _take_pending()
+    if not pending:
+        return 0
+    
+    app = _state['app']
+    with app.app_context():
+        try:
+            _write(pending)
+        except DataError as e:
+            # A row Postgres rejects would fail every batch it is restored
+            # into; write the rows one at a time and drop the ones that fail
+            db.session.rollback()
+            logger.warning(f"Location batch rejected, retrying per user: {e}")
+            return _write_each(pending)
+        except Exception:
+            db.session.rollback()
+            _restore(pending)
+            raise
+    return len(pending)
+
+
+def _write(pending):
+    from app.models.user import User
+    
+    v = values(
+        column('id', UUID(as_uuid=False)),
+        column('lat', Float(precision=53)),
+        column('lng', Float(precision=53)),
+        column('ts', DateTime(timezone=True)),
+        name='v',
+    ).data([(user_id, lat, lng, ts) for user_id, (lat, lng, ts) in pending.items()])
+    # Explicit casts, so a VALUES list Postgres can't infer a type for (e.g.
+    # all NULLs) is still double precision / timestamptz
+    stmt = (
+        update(User)
+        .where(User.id == v.c.id)
+        .values(
+            current_lat=cast(v.c.lat, Float(precision=53)),
+            current_lng=cast(v.c.lng, Float(precision=53)),
+            last_location_update=cast(v.c.ts, DateTime(timezone=True)),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(stmt)
+    db.session.commit()
+
+
+def _write_each(pending):
+    written = 0
+    items = list(pending.items())
+    for i, (user_id, loc) in enumerate(items):
+        try:
+            _write({user_id: loc})
+            written += 1
+        except DataError as e:
+            db.session.rollback()
+            logger.error(f"Dropped location for user {user_id}: {e}")
+        except Exception:
+            # Not this row's fault (e.g. the connection went away); keep the
+            # rest for the next flush
+            db.session.rollback()
+            _restore(dict(items[i:]))
+            raise
+    return written
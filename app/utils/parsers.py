@@ -0,0 +1,61 @@
+"""Request value parsers for the fixed ISO formats the frontend sends"""
+import base64
+import sys
+import uuid
+from datetime import date, datetime, time
+
+# datetime.fromisoformat() accepts a trailing 'Z' from Python 3.11 on
+_FROMISOFORMAT_Z = sys.version_info >= (3, 11)
+
+
+def parse_date(value):
+    """
+    'YYYY-MM-DD' (or any ISO datetime string) to a date.
+    
+    The plain date form is built straight from integer slices; anything else
+    falls back to datetime.fromisoformat(). Raises ValueError like it.
+    """
+    if len(value) == 10 and value[4] == '-' and value[7] == '-':
+        return date(int(value[0:4]), int(value[5:7]), int(value[8:10]))
+    return datetime.fromisoformat(value).date()
+
+
+def parse_datetime(value):
+    """
+    ISO 8601 string (e.g. JavaScript's toISOString() output) to a datetime.
+    
+    A trailing 'Z' means UTC. It is parsed natively on Python 3.11+, and only
+    rewritten to '+00:00' on older versions. Raises ValueError like
+    datetime.fromisoformat().
+    """
+    if not _FROMISOFORMAT_Z and value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value)
+
+
+def parse_time(value):
+    """
+    'HH:MM' or 'HH:MM:SS' to a time; other ISO forms fall back to
+    time.fromisoformat(). Raises ValueError like it.
+    """
+    if len(value) == 5 and value[2] == ':':
+        return time(int(value[0:2]), int(value[3:5]))
+    if len(value) == 8 and value[2] == ':' and value[5] == ':':
+        return time(int(value[0:2]), int(value[3:5]), int(value[6:8]))
+    return time.fromisoformat(value)
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque keyset cursor for the last row of a page, from its (created_at, id)"""
+    raw = f'{created_at.isoformat()}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(value):
+    """
+    (created_at, id) from an encode_cursor() value. Raises ValueError on a
+    malformed cursor.
+    """
+    raw = base64.urlsafe_b64decode(value).decode()
+    created_at, _, row_id = raw.rpartition('|')
+    return parse_datetime(created_at), uuid.UUID(row_id)
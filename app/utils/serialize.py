@@ -0,0 +1,75 @@
+"""Small converters shared by model to_dict() methods"""
+from operator import attrgetter
+
+
+def u(value):
+    """UUID (or any value) to str, passing None through"""
+    return None if value is None else str(value)
+
+
+def iso(value):
+    """date/datetime to ISO 8601 string, passing None through"""
+    return None if value is None else value.isoformat()
+
+
+def _fields(fields):
+    """Split field specs into JSON keys and a getter that always returns a tuple"""
+    keys = tuple(f if isinstance(f, str) else f[0] for f in fields)
+    attrs = tuple(f if isinstance(f, str) else f[1] for f in fields)
+    if not attrs:
+        return keys, lambda obj: ()
+    getter = attrgetter(*attrs)
+    if len(attrs) == 1:
+        return keys, lambda obj: (getter(obj),)
+    return keys, getter
+
+
+def dict_builder(simple=(), uuids=(), dts=()):
+    """
+    Build a to_dict() method from field name tuples.
+    
+    Each group is fetched with a single operator.attrgetter call: simple values
+    are copied as-is, uuids go through u() and dts through iso(). A field is an
+    attribute name, or a (key, attribute) pair when the JSON key differs.
+    """
+    simple_keys, get_simple = _fields(simple)
+    uuid_keys, get_uuids = _fields(uuids)
+    dt_keys, get_dts = _fields(dts)
+    
+    def to_dict(self):
+        d = dict(zip(simple_keys, get_simple(self)))
+        d.update(zip(uuid_keys, map(u, get_uuids(self))))
+        d.update(zip(dt_keys, map(iso, get_dts(self))))
+        return d
+    
+    return to_dict
+
+
+def raw_builder(fields):
+    """
+    Build a to_raw() method: each field's value as-is (UUIDs, datetimes and
+    Decimals are left for app.utils.json to encode), keyed in field order.
+    """
+    keys, getter = _fields(fields)
+    
+    def to_raw(self):
+        return dict(zip(keys, getter(self)))
+    
+    return to_raw
+
+
+def dict_from_raw(uuids=(), dts=()):
+    """
+    Build a to_dict() method on top of the model's to_raw(): the uuids keys go
+    through u() and the dts keys through iso(), in place, so the key order of
+    to_raw() is kept.
+    """
+    def to_dict(self):
+        d = self.to_raw()
+        for key in uuids:
+            d[key] = u(d[key])
+        for key in dts:
+            d[key] = iso(d[key])
+        return d
+    
+    return to_dict
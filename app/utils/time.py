@@ -0,0 +1,7 @@
+"""Time helpers shared by models and routes"""
+from datetime import datetime, timezone
+
+
+def utcnow():
+    """Timezone-aware current UTC time; pass as a column default, not a lambda"""
+    return datetime.now(timezone.utc)
@@ -0,0 +1,52 @@
+"""Custom column types shared by the models"""
+import enum
+from sqlalchemy.types import TypeDecorator, SmallInteger
+from sqlalchemy.dialects.postgresql import UUID
+
+
+class UUIDString(TypeDecorator):
+    """
+    Postgres UUID column that loads as the canonical 36-char string.
+
+    Equivalent to UUID(as_uuid=False), but also accepts uuid.UUID values on
+    write, so callers can keep passing user.id / job.id straight through.
+    Results come back from the driver untouched - no uuid.UUID is built and
+    to_dict() doesn't need str().
+    """
+    impl = UUID(as_uuid=False)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else str(value)
+
+
+class Role(enum.IntEnum):
+    """User roles as stored in users.role (smallint)"""
+    ADMIN = 1
+    CLERK = 2
+    AGENT = 3
+
+
+_ROLE_NAMES = {role.value: role.name.lower() for role in Role}
+_ROLE_CODES = {name: value for value, name in _ROLE_NAMES.items()}
+
+
+class RoleType(TypeDecorator):
+    """
+    users.role stored as a 2-byte smallint code instead of a Postgres ENUM.
+
+    Binds a Role, its int code or its name ('clerk'), and loads the name, so
+    user.role == 'clerk', filter_by(role='clerk') and the JSON API keep
+    working unchanged while comparisons run as integer equality. Unknown
+    names bind as NULL: filters match nothing and inserts hit NOT NULL.
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return None if value is None else int(value)
+        return _ROLE_CODES.get(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else _ROLE_NAMES.get(value)
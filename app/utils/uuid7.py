@@ -0,0 +1,20 @@
+"""Time-ordered UUID generation (RFC 9562 version 7)"""
+import secrets
+import time
+import uuid
+
+
+def uuid7():
+    """
+    Generate a UUIDv7.
+
+    Layout: 48-bit unix timestamp in milliseconds, 4-bit version, 12 random
+    bits, 2-bit variant, 62 random bits. Keys generated close together in time
+    sort close together, so inserts land on the right edge of the primary key
+    B-tree instead of at random pages.
+    """
+    ts_ms = time.time_ns() // 1_000_000
+    b = bytearray(ts_ms.to_bytes(6, 'big') + secrets.token_bytes(10))
+    b[6] = (b[6] & 0x0F) | 0x70  # version 7
+    b[8] = (b[8] & 0x3F) | 0x80  # RFC 4122 variant
+    return uuid.UUID(bytes=bytes(b))